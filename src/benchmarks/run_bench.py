@@ -0,0 +1,151 @@
+"""
+Offline benchmark of the translation pipeline.
+
+Generates synthetic workbooks, translates them with `translate_file` (or
+`translate_folder` with --files > 1) against the stub backend, and prints one JSON
+object per run. Run from the `src` directory:
+
+    python -m benchmarks.run_bench --rows 20000 --cols 12 --sheets 3 --output bench.jsonl
+
+Appending every run to the same --output file gives a history that can be diffed
+across versions.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.synth import generate_workbook
+from utils.backends import StubBackend
+from utils.scheduler import RequestScheduler
+from utils.row_ds import CancellationToken
+from utils.handler import translate_file, translate_folder
+from utils import metrics
+
+
+class NullProgress:
+    def progress(self, value):
+        pass
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak RSS of this process, or with RUSAGE_CHILDREN of the largest of its finished child processes."""
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def code_version():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_pipeline(paths, folder, args, timings):
+    backend = StubBackend(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    scheduler = RequestScheduler(max_concurrency=args.concurrency, rate=args.rate, burst=args.rate)
+    log_queue = asyncio.Queue()
+    token = CancellationToken()
+    if len(paths) > 1:
+        await translate_folder(folder, args.src, args.dest, token, log_queue, NullProgress(),
+                               translator=backend, scheduler=scheduler, timings=timings)
+    else:
+        await translate_file(paths[0], args.src, args.dest, token, log_queue, NullProgress(),
+                             translator=backend, scheduler=scheduler, timings=timings)
+    return backend, scheduler
+
+
+def measure(paths, folder, args):
+    """
+    Runs the pipeline and returns its figures. Called in a process of its own, so the peak
+    RSS of its children is that of the pipeline's parse and save workers alone.
+    """
+    timings = {}
+    start = time.perf_counter()
+    backend, scheduler = asyncio.run(run_pipeline(paths, folder, args, timings))
+    wall = time.perf_counter() - start
+    # Folder jobs parse and save workbooks in worker processes, which hold most of the memory
+    main_rss, workers_rss = peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return {
+        "wall_seconds": round(wall, 3),
+        "requests": backend.requests,
+        "scheduler": scheduler.stats(),
+        "peak_rss_mb": max(main_rss, workers_rss),
+        "peak_rss_mb_main": main_rss,
+        "peak_rss_mb_workers": workers_rss,
+        # Summed over files, so with --files > 1 phases can add up to more than the wall time
+        "phases": {name: round(seconds, 3) for name, seconds in timings.items()},
+        "metrics": metrics.REGISTRY.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the translation pipeline against the offline stub backend.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--cols", type=int, default=10)
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5)
+    parser.add_argument("--formula-ratio", type=float, default=0.05)
+    parser.add_argument("--cell-len", type=int, default=20)
+    parser.add_argument("--extension", choices=("xlsx", "xlsm"), default="xlsx")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub backend latency per request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=1000.0, help="scheduler requests per second")
+    parser.add_argument("--src", default="auto")
+    parser.add_argument("--dest", default="en")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="append the JSON result to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="xslm-bench-") as folder:
+        paths = [os.path.join(folder, f"bench_{idx}.{args.extension}") for idx in range(args.files)]
+        # Generate in a child process so the generator does not count towards the pipeline's peak RSS
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            futures = [
+                executor.submit(generate_workbook, path, rows=args.rows, cols=args.cols, sheets=args.sheets,
+                                repeat_ratio=args.repeat_ratio, formula_ratio=args.formula_ratio,
+                                cell_len=args.cell_len, seed=args.seed + idx)
+                for idx, path in enumerate(paths)
+            ]
+            summaries = [future.result() for future in futures]
+
+        # The pipeline gets a fresh process too, so the generator is not among its children
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            measured = executor.submit(measure, paths, folder, args).result()
+
+    cells = sum(summary["cells"] for summary in summaries)
+    wall = measured["wall_seconds"]
+    result = {
+        "version": code_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "params": vars(args),
+        "cells": cells,
+        "string_cells": sum(summary["string"] for summary in summaries),
+        "input_bytes": sum(summary["bytes"] for summary in summaries),
+        "cells_per_second": round(cells / wall, 1) if wall else None,
+        **measured,
+    }
+
+    line = json.dumps(result)
+    print(line)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
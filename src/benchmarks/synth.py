@@ -0,0 +1,81 @@
+import os
+import random
+import string
+import argparse
+from openpyxl import Workbook
+
+
+def _random_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length].strip() or "x"
+
+
+def generate_workbook(path, rows=1000, cols=10, sheets=1, repeat_ratio=0.5, formula_ratio=0.05,
+                      numeric_ratio=0.2, empty_ratio=0.1, cell_len=20, vocabulary=200, seed=0):
+    """
+    Writes a synthetic workbook to `path` (.xlsx or .xlsm) and returns a summary of what it contains.
+
+    Each cell is, in proportion, empty, a number, a formula, or a string. Of the strings,
+    `repeat_ratio` are drawn from a pool of `vocabulary` phrases (headers, product names)
+    and the rest are unique. Strings are about `cell_len` characters long.
+    """
+    rng = random.Random(seed)
+    pool = [_random_text(rng, cell_len) for _ in range(vocabulary)]
+    counts = {"empty": 0, "numeric": 0, "formula": 0, "string": 0}
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for sheet_idx in range(sheets):
+        ws = wb.create_sheet(f"Sheet{sheet_idx + 1}")
+        for row_idx in range(1, rows + 1):
+            values = []
+            for col_idx in range(cols):
+                pick = rng.random()
+                if pick < empty_ratio:
+                    values.append(None)
+                    counts["empty"] += 1
+                elif pick < empty_ratio + numeric_ratio:
+                    values.append(rng.randint(0, 100000))
+                    counts["numeric"] += 1
+                elif pick < empty_ratio + numeric_ratio + formula_ratio:
+                    values.append(f"=ROW()*{col_idx + 1}")
+                    counts["formula"] += 1
+                elif rng.random() < repeat_ratio:
+                    values.append(rng.choice(pool))
+                    counts["string"] += 1
+                else:
+                    values.append(_random_text(rng, cell_len))
+                    counts["string"] += 1
+            ws.append(values)
+
+    # openpyxl cannot author a vbaProject.bin, so an .xlsm written here carries no macros
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb.save(path)
+    counts["cells"] = rows * cols * sheets
+    counts["bytes"] = os.path.getsize(path)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic workbook for benchmarks.")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--cols", type=int, default=10)
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5)
+    parser.add_argument("--formula-ratio", type=float, default=0.05)
+    parser.add_argument("--cell-len", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate_workbook(args.path, rows=args.rows, cols=args.cols, sheets=args.sheets,
+                            repeat_ratio=args.repeat_ratio, formula_ratio=args.formula_ratio,
+                            cell_len=args.cell_len, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import streamlit
 
 import streamlit.web.cli as stcli
 import os, sys
+import multiprocessing
 
 
 def resolve_path(path):
@@ -10,6 +11,8 @@ def resolve_path(path):
 
 
 if __name__ == "__main__":
+    # Folder jobs parse workbooks in worker processes, which a frozen app must support
+    multiprocessing.freeze_support()
     sys.argv = [
         "streamlit",
         "run",
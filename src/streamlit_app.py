@@ -1,10 +1,10 @@
 import os
-import asyncio
-import tempfile
 import streamlit as st
 
-from utils.row_ds import CancellationToken
-from utils.handler import translate_file, translate_folder
+from utils.jobs import JobManager, DONE, FAILED, CANCELLED
+from utils.tm_cache import TranslationMemory, DEFAULT_TM_PATH
+from utils import metrics
+from utils.logging_mech import enable_file_logging
 
 import os
 import sys
@@ -18,8 +18,103 @@ else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 sys.path.append(os.path.join(BASE_DIR, 'utils'))
-TEMP_DIR = os.path.join(BASE_DIR, "temp")
-os.makedirs(TEMP_DIR, exist_ok=True)
+enable_file_logging()
+
+@st.cache_resource
+def get_translation_memory():
+    # One SQLite connection shared by every session of this server
+    return TranslationMemory(DEFAULT_TM_PATH)
+
+def translation_memory_controls():
+    """Sidebar controls for the persistent translation memory. Returns the memory to use, or None."""
+    translation_memory = get_translation_memory()
+    st.sidebar.header("Translation memory")
+    use_memory = st.sidebar.checkbox("Reuse previous translations", value=True)
+    if st.sidebar.button("Clear translation memory"):
+        translation_memory.clear()
+        st.sidebar.success("Translation memory cleared.")
+    stats = translation_memory.stats()
+    st.sidebar.caption(
+        f"{stats['entries']} / {stats['max_entries']} entries, {stats['hits']} hits, {stats['misses']} misses"
+    )
+    return translation_memory if use_memory else None
+
+@st.cache_resource
+def get_metrics_server():
+    # Prometheus scrape endpoint, started once per server process
+    return metrics.start_metrics_server()
+
+def render_metrics(container, numbers):
+    """Shows a metrics snapshot (or delta) as a dashboard of st.metric tiles."""
+    latency = numbers["xslm_backend_latency_seconds"]
+    batch_items = numbers["xslm_batch_items"]
+    with container.container():
+        cols = st.columns(4)
+        cols[0].metric("Cells translated", numbers["xslm_cells_translated_total"])
+        cols[1].metric("Cells skipped", numbers["xslm_cells_skipped_total"],
+                       help=f"{numbers['xslm_cells_filtered_total']} of them recognised by the classifier")
+        cols[2].metric("Requests", numbers["xslm_requests_total"])
+        cols[3].metric("Retries", numbers["xslm_retries_total"])
+        cols = st.columns(4)
+        cols[0].metric("Cache hits", numbers["xslm_cache_hits_total"] + numbers["xslm_dedup_hits_total"])
+        cols[1].metric("Avg batch size", f"{batch_items['sum'] / batch_items['count']:.1f}" if batch_items["count"] else "-")
+        cols[2].metric("Avg latency", f"{latency['sum'] / latency['count']:.2f}s" if latency["count"] else "-")
+        cols[3].metric("MB in / out", f"{numbers['xslm_bytes_in_total'] / 1e6:.1f} / {numbers['xslm_bytes_out_total'] / 1e6:.1f}")
+
+@st.cache_resource
+def get_job_manager():
+    # One event loop thread, backend client pool and scheduler for every session of this server
+    return JobManager()
+
+def render_job(job):
+    """Status, progress, metrics, logs and result of one job."""
+    manager = get_job_manager()
+    with st.container(border=True):
+        st.write(f"**{job.description}** · {job.kind} · `{job.id}` · {job.status}")
+        st.progress(job.progress_value)
+        job_metrics = job.job_metrics()
+        if job_metrics is not None:
+            render_metrics(st.empty(), job_metrics)
+        logs = job.logs
+        if logs:
+            with st.expander(f"Logs ({len(logs)})", expanded=job.active):
+                st.text("\n".join(logs[-200:]))
+        if job.active:
+            if st.button("Cancel", key=f"cancel-{job.id}"):
+                manager.cancel(job.id)
+        elif job.status == DONE and job.kind == "file" and job.result:
+            # A list of destination languages gives {language: output}; uploads are translated in memory
+            outputs = job.result if isinstance(job.result, dict) else {None: job.result}
+            for lang, output in outputs.items():
+                if output is None:
+                    continue
+                label = f"Download Translated File ({lang})" if lang else "Download Translated File"
+                st.download_button(label, output.getvalue(), file_name=output.filename, key=f"download-{job.id}-{lang}")
+        elif job.status == DONE and job.kind == "folder":
+            partial = getattr(job.result, "partial", {})
+            translated = sum(1 for input_file, result in (job.result or {}).items()
+                             if result and (not isinstance(result, dict) or all(result.values())) and input_file not in partial)
+            st.success(f"{translated} of {len(job.result or {})} files translated.")
+            if partial:
+                st.warning(f"{len(partial)} files were written with strings left untranslated (see the logs); translate the folder again to retry them.")
+        elif job.status == FAILED:
+            st.error(f"An error occurred: {job.error}")
+        elif job.status == CANCELLED:
+            st.warning("Translation cancelled.")
+
+@st.fragment(run_every=1)
+def jobs_panel():
+    """This session's jobs, refreshed every second without rerunning the whole page."""
+    manager = get_job_manager()
+    jobs = [manager.get(job_id) for job_id in st.session_state.get("job_ids", [])]
+    jobs = [job for job in jobs if job is not None]
+    if jobs:
+        st.subheader("Jobs")
+    for job in reversed(jobs):
+        render_job(job)
+
+def track_job(job_id):
+    st.session_state.setdefault("job_ids", []).append(job_id)
 
 def main():
     
@@ -66,9 +161,15 @@ def main():
     }
 
     src_lang = st.selectbox("Source Language", list(src_language_options.keys()), format_func=lambda x: src_language_options[x])
-    dest_lang = st.selectbox("Destination Language", list(desc_language_options.keys()), format_func=lambda x: desc_language_options[x])
+    dest_langs = st.multiselect("Destination Languages", list(desc_language_options.keys()), default=["en"], format_func=lambda x: desc_language_options[x])
+    # Several languages are translated in one pass over the workbook, one output each
+    dest_lang = dest_langs[0] if len(dest_langs) == 1 else dest_langs
 
-    log_queue = asyncio.Queue()
+    translation_memory = translation_memory_controls()
+    get_metrics_server()
+    manager = get_job_manager()
+    with st.sidebar.expander("Metrics since server start"):
+        render_metrics(st.empty(), metrics.REGISTRY.snapshot())
 
     if option == "Single File":
         uploaded_file = st.file_uploader("Upload Excel file", type=["xlsm", "xlsx"])
@@ -76,33 +177,10 @@ def main():
         if uploaded_file:
             st.write("Uploaded file:", uploaded_file.name)
 
-            if st.button("Translate File"):
+            if st.button("Translate File", disabled=not dest_langs):
                 try:
-                    temp_input_file = os.path.join(TEMP_DIR, uploaded_file.name)
-                    with open(temp_input_file, "wb") as f:
-                        f.write(uploaded_file.read())
-
-                    cancellation_token = CancellationToken()
-                    progress_bar = st.progress(0)
-
-                    # Run the translation synchronously
-                    translated_file_path = asyncio.run(
-                        translate_file(temp_input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar)
-                    )
-
-                    # Display logs
-                    while not log_queue.empty():
-                        log_message = log_queue.get_nowait()
-                        st.info(log_message)
-
-                    if translated_file_path:
-                        st.success("Translation completed. Download your file below:")
-                        with open(translated_file_path, "rb") as f:
-                            st.download_button(
-                                "Download Translated File",
-                                f,
-                                file_name=os.path.basename(translated_file_path),
-                            )
+                    # Translated straight from the upload's buffer into memory; the panel below follows the job
+                    track_job(manager.submit_file(uploaded_file, src_lang, dest_lang, translation_memory=translation_memory))
 
                 except Exception as e:
                     st.error(f"An error occurred: {e}")
@@ -111,24 +189,15 @@ def main():
         
         folder_path = st.text_input("Enter folder path containing Excel files")
 
-        if st.button("Translate Folder"):
+        if st.button("Translate Folder", disabled=not dest_langs):
             try:
-                cancellation_token = CancellationToken()
-                progress_bar = st.progress(0)
-
-                async def process_folder():
-                    await translate_folder(folder_path, src_lang, dest_lang, cancellation_token, log_queue, progress_bar)
-                    st.success("Translation of all files in the folder completed.")
-
-                asyncio.run(process_folder())
-
-                while not log_queue.empty():
-                    log_message = log_queue.get_nowait()
-                    st.info(log_message)
+                track_job(manager.submit_folder(folder_path, src_lang, dest_lang, translation_memory=translation_memory))
 
             except Exception as e:
                 st.error(f"An error occurred: {e}")
 
+    jobs_panel()
+
 if __name__ == "__main__":
     import streamlit as st  # Import streamlit within the main block
     st.set_page_config(page_title="Excel Translator", layout="centered")
@@ -0,0 +1,130 @@
+import time
+import random
+import asyncio
+import contextlib
+from collections import deque
+from utils.logging_mech import logger
+from utils.batching import DEFAULT_MAX_BATCH_CHARS, DEFAULT_MAX_BATCH_ITEMS
+
+
+class BackendError(Exception):
+    """A translation backend refused or failed a request. `status_code` mirrors HTTP where it applies."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TranslationBackend:
+    """
+    Interface of a translation engine.
+
+    A backend translates a batch of strings in one call and declares how large a batch
+    it accepts; the deduplicator never packs batches beyond `max_batch_chars` or
+    `max_batch_items`. Backends are async context managers and are closed at job end.
+    """
+
+    name = "base"
+    max_batch_chars = DEFAULT_MAX_BATCH_CHARS
+    max_batch_items = DEFAULT_MAX_BATCH_ITEMS
+
+    async def translate_batch(self, texts, src, dest):
+        """Returns the translations of `texts`, in order."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+
+class StubBackend(TranslationBackend):
+    """
+    Offline, deterministic stand-in for load tests, benchmarks and CI.
+
+    Every text is pseudo-translated (`mode="tag"` prefixes `[dest] `, `mode="reverse"`
+    reverses it) after `latency` seconds plus up to `jitter` seconds. A fraction
+    `error_rate` of requests fail with a 500, and requests beyond `max_rps` in any one
+    second are answered with a 429 like a throttling service would. Runs with the same
+    `seed` make the same choices.
+    """
+
+    name = "stub"
+
+    def __init__(self, mode="tag", latency=0.05, jitter=0.0, error_rate=0.0, max_rps=None,
+                 max_batch_chars=DEFAULT_MAX_BATCH_CHARS, max_batch_items=DEFAULT_MAX_BATCH_ITEMS, seed=0):
+        if mode not in ("tag", "reverse"):
+            raise ValueError(f"Unknown stub mode: {mode}")
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.max_batch_chars = max_batch_chars
+        self.max_batch_items = max_batch_items
+        self._random = random.Random(seed)
+        self._recent = deque()
+        self.requests = 0
+
+    def _pseudo_translate(self, text, dest):
+        if self.mode == "reverse":
+            return text[::-1]
+        return f"[{dest}] {text}"
+
+    def _throttled(self):
+        if self.max_rps is None:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_rps:
+            return True
+        self._recent.append(now)
+        return False
+
+    async def translate_batch(self, texts, src, dest):
+        self.requests += 1
+        if len(texts) > self.max_batch_items or sum(map(len, texts)) > self.max_batch_chars:
+            raise BackendError("Batch exceeds the declared limits", status_code=413)
+        if self._throttled():
+            raise BackendError("Too many requests", status_code=429)
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self._random.random() < self.error_rate:
+            raise BackendError("Stub backend failure", status_code=500)
+        return [self._pseudo_translate(text, dest) for text in texts]
+
+
+def _googletrans_backend(**options):
+    # Imported lazily so the stub can run without googletrans/httpx installed
+    from utils.client_pool import TranslatorPool
+    return TranslatorPool(**options)
+
+
+BACKENDS = {
+    "googletrans": _googletrans_backend,
+    "stub": StubBackend,
+}
+
+
+def create_backend(name, **options):
+    """Builds the backend registered under `name` with the given options."""
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown translation backend '{name}', expected one of {sorted(BACKENDS)}")
+    logger.debug(f"Using translation backend '{name}' with options {options}")
+    return factory(**options)
+
+
+@contextlib.asynccontextmanager
+async def job_translator(translator=None, backend="googletrans", backend_options=None):
+    """Yields `translator` unchanged, or a fresh `backend` that is closed when the block exits."""
+    if translator is not None:
+        yield translator
+        return
+    async with create_backend(backend, **(backend_options or {})) as created:
+        yield created
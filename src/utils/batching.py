@@ -0,0 +1,24 @@
+import os
+
+DEFAULT_MAX_BATCH_CHARS = int(os.environ.get("XSLM_MAX_BATCH_CHARS", "4500"))
+DEFAULT_MAX_BATCH_ITEMS = int(os.environ.get("XSLM_MAX_BATCH_ITEMS", "100"))
+
+
+def pack_batches(texts, max_chars=DEFAULT_MAX_BATCH_CHARS, max_items=DEFAULT_MAX_BATCH_ITEMS):
+    """
+    Packs texts into request batches of at most `max_items` texts and `max_chars` characters.
+
+    Texts keep their order. A text longer than `max_chars` on its own gets a batch of its own,
+    since long strings are cut up beforehand (see utils.segmenter).
+    """
+    batch = []
+    batch_chars = 0
+    for text in texts:
+        if batch and (len(batch) >= max_items or batch_chars + len(text) > max_chars):
+            yield batch
+            batch = []
+            batch_chars = 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        yield batch
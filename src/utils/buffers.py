@@ -0,0 +1,98 @@
+"""
+In-memory workbooks for translate_file, so uploads never need a path on disk.
+
+A workbook may be given as bytes or a file-like object (a Streamlit upload, an open file,
+an io.BytesIO). It is read through a private buffer that shares the caller's bytes where
+Python allows it. The translation is written to a WorkbookBuffer, which stays in memory up to
+SPILL_THRESHOLD_BYTES and then rolls over to an anonymous file in SPILL_DIR. That file is
+removed by the OS as soon as the buffer is closed or garbage collected, even after a crash.
+"""
+import io
+import os
+import shutil
+import tempfile
+
+# Buffers larger than this move from memory to an anonymous file in SPILL_DIR
+SPILL_THRESHOLD_BYTES = int(float(os.environ.get("XSLM_SPILL_THRESHOLD_MB", "64")) * 1024 * 1024)
+SPILL_DIR = os.environ.get("XSLM_SPILL_DIR", os.path.join(tempfile.gettempdir(), "xslm"))
+
+DEFAULT_NAME = "workbook.xlsx"
+
+
+def spill_dir():
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    return SPILL_DIR
+
+
+class WorkbookBuffer(tempfile.SpooledTemporaryFile):
+    """A workbook in memory, spilled to SPILL_DIR above SPILL_THRESHOLD_BYTES. `filename` is the name to offer for download."""
+
+    def __init__(self, filename=DEFAULT_NAME, max_size=None):
+        super().__init__(max_size=SPILL_THRESHOLD_BYTES if max_size is None else max_size, dir=spill_dir())
+        self.filename = filename
+
+    def getvalue(self):
+        """The whole workbook as bytes, without a copy while it is still in memory."""
+        if isinstance(self._file, io.BytesIO):
+            return self._file.getvalue()
+        position = self.tell()
+        self.seek(0)
+        data = self.read()
+        self.seek(position)
+        return data
+
+    def size(self):
+        position = self.tell()
+        self.seek(0, io.SEEK_END)
+        size = self.tell()
+        self.seek(position)
+        return size
+
+
+def is_buffer(source):
+    """True for bytes and file-like objects, False for paths."""
+    return not isinstance(source, (str, os.PathLike))
+
+
+def source_name(source):
+    """A path, or the file name of a buffer (Streamlit uploads have one), for logs and output names."""
+    if not is_buffer(source):
+        return os.fspath(source)
+    return getattr(source, "filename", None) or getattr(source, "name", None) or DEFAULT_NAME
+
+
+def source_size(source):
+    if not is_buffer(source):
+        return os.path.getsize(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, WorkbookBuffer):
+        return source.size()
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer().nbytes
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    return size
+
+
+def open_source(source):
+    """
+    A seekable reader of its own over `source`, so concurrent jobs never move each other's
+    position. BytesIO-like sources (Streamlit uploads included) share their bytes with it;
+    other file objects are copied into a WorkbookBuffer.
+    """
+    name = source_name(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        reader = io.BytesIO(source)
+    elif hasattr(source, "getvalue") and not getattr(source, "_rolled", False):
+        # BytesIO.getvalue() and BytesIO(bytes) both reuse the same bytes object rather than copying it
+        reader = io.BytesIO(source.getvalue())
+    else:
+        reader = WorkbookBuffer(name)
+        source.seek(0)
+        shutil.copyfileobj(source, reader)
+        reader.seek(0)
+        return reader
+    reader.name = name
+    return reader
@@ -0,0 +1,179 @@
+"""
+Pre-classification of cell text, keeping values that need no translation off the network.
+
+Numbers, dates, codes, URLs and the like are recognised by a set of named regular
+expressions compiled into a single pattern. Per-column overrides force a column to be
+skipped (e.g. a column of product codes) or translated regardless of the rules. Text
+the rules let through can finally be checked by utils.langid, so cells already written in
+the destination language are skipped too (opt-in: XSLM_SKIP_TARGET_LANGUAGE=1).
+
+The rules can be configured with a JSON file named by XSLM_CLASSIFIER_CONFIG:
+
+    {
+        "disable": ["code"],
+        "rules": {"ticket": "TCK-\\\\d+"},
+        "columns": {"B": "skip", "Notes!C": "translate"},
+        "skip_target_language": true
+    }
+"""
+import os
+import re
+import json
+from collections import Counter
+from utils.logging_mech import logger
+from utils.langid import IDENTIFIER
+
+CLASSIFIER_CONFIG = os.environ.get("XSLM_CLASSIFIER_CONFIG")
+SKIP_TARGET_LANGUAGE = os.environ.get("XSLM_SKIP_TARGET_LANGUAGE", "0") == "1"
+
+SKIP, TRANSLATE = "skip", "translate"
+
+_NUMBER = r"[+-]?(?:\d{1,3}(?:[,.' \u00a0]\d{3})+|\d+)(?:[.,]\d+)?"
+_CURRENCY_SIGN = r"(?:[$€£¥₹]|USD|EUR|GBP|JPY|CHF|CNY|INR)"
+
+# Tried in order, so the more specific rules come first and name the reason; values are
+# matched against the whole (stripped) cell text
+DEFAULT_RULES = {
+    "number": rf"{_NUMBER}(?:\s?%)?",
+    "currency": rf"{_CURRENCY_SIGN}\s?{_NUMBER}|{_NUMBER}\s?{_CURRENCY_SIGN}",
+    "date": r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?|\d{1,2}:\d{2}(?::\d{2})?(?:\s?[AaPp][Mm])?",
+    "url": r"(?:https?|ftp)://\S+|www\.\S+",
+    "email": r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+",
+    "path": r"(?:[A-Za-z]:[\\/]|\\\\|~?/)\S*",
+    # A separator before the digits (SKU-1234, #42, INV/2023/001) or letters then several digits (AB1234);
+    # ordinals and words with a digit in them (2nd, 12th, abc1def) are text
+    "code": r"[A-Za-z]{0,6}[-_/#.]\d[\w/-]*|[A-Za-z]{1,6}\d{2,}[\w/-]*",
+    # Anything without a single letter: punctuation, separators, numbering like 1.2.3
+    "symbols": r"[\W\d_]+",
+}
+
+
+def column_index(column):
+    """1-based index of a column given as a letter ("B") or a number."""
+    if isinstance(column, int) or column.isdigit():
+        return int(column)
+    index = 0
+    for char in column.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index
+
+
+class CellClassifier:
+    """
+    Decides which cell texts are sent for translation.
+
+    `rules` maps names to patterns (DEFAULT_RULES by default, with `extra_rules` tried
+    first and `disable` removing some). `columns` maps a column ("B") or a sheet-qualified
+    column ("Sheet1!B") to SKIP or TRANSLATE; TRANSLATE bypasses the rules but never
+    makes a formula or an empty cell translatable. With an `identifier` (a
+    utils.langid.LanguageIdentifier), sheet filters made for a destination language also
+    skip text already in that language.
+    """
+
+    def __init__(self, rules=None, extra_rules=None, disable=(), columns=None, identifier=None):
+        merged = dict(extra_rules or {})
+        for name, pattern in (DEFAULT_RULES if rules is None else rules).items():
+            merged.setdefault(name, pattern)
+        rules = {name: pattern for name, pattern in merged.items() if name not in set(disable)}
+        self.rule_names = list(rules)
+        self._pattern = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in rules.items())) if rules else None
+        self.identifier = identifier
+        self.columns = {}
+        self.sheet_columns = {}
+        for key, decision in (columns or {}).items():
+            if decision not in (SKIP, TRANSLATE):
+                raise ValueError(f"Column override for {key} must be '{SKIP}' or '{TRANSLATE}', not {decision!r}")
+            if "!" in key:
+                sheet, column = key.rsplit("!", 1)
+                self.sheet_columns[(sheet, column_index(column))] = decision
+            else:
+                self.columns[column_index(key)] = decision
+
+    @classmethod
+    def from_config(cls, config, identifier=None, skip_target_language=SKIP_TARGET_LANGUAGE):
+        return cls(extra_rules=config.get("rules"), disable=config.get("disable", ()), columns=config.get("columns"),
+                   identifier=identifier if config.get("skip_target_language", skip_target_language) else None)
+
+    def classify(self, text):
+        """The name of the rule `text` matches, "whitespace" for blank text, or None when it should be translated."""
+        stripped = text.strip()
+        if not stripped:
+            return "whitespace"
+        if self._pattern is None:
+            return None
+        match = self._pattern.fullmatch(stripped)
+        return match.lastgroup if match else None
+
+    def column_override(self, sheet, column):
+        return self.sheet_columns.get((sheet, column), self.columns.get(column))
+
+    def in_language(self, text, dest_lang):
+        """True when the identifier is confident `text` is already in `dest_lang`."""
+        return self.identifier is not None and dest_lang is not None and self.identifier.is_language(text, dest_lang)
+
+    def sheet_filter(self, sheet, dest_lang=None):
+        return SheetFilter(self, sheet, dest_lang)
+
+    def filter_sheet(self, sheet, rows, cols, texts, dest_lang=None):
+        """
+        Classifies the cells of a sheet in bulk (each distinct text once) and returns
+        (rows, cols, texts) of the cells to translate plus a Counter of the filtered ones by reason.
+        """
+        sheet_filter = self.sheet_filter(sheet, dest_lang)
+        kept = [(row, col, text) for row, col, text in zip(rows, cols, texts) if sheet_filter(col, text) is None]
+        return [r for r, _, _ in kept], [c for _, c, _ in kept], [t for _, _, t in kept], sheet_filter.filtered
+
+    def filter_sheets(self, sheets, dest_lang=None):
+        """filter_sheet over extract_cells' result; returns the filtered sheets and the combined Counter."""
+        filtered = Counter()
+        result = []
+        for title, rows, cols, texts in sheets:
+            rows, cols, texts, sheet_filtered = self.filter_sheet(title, rows, cols, texts, dest_lang)
+            result.append((title, rows, cols, texts))
+            filtered.update(sheet_filtered)
+        return result, filtered
+
+
+class SheetFilter:
+    """
+    Classification of one sheet's cells: call with (column, text) for the skip reason or None.
+
+    With a `dest_lang`, text already in that language is skipped as "dest_language".
+    """
+
+    def __init__(self, classifier, sheet, dest_lang=None):
+        self.classifier = classifier
+        self.sheet = sheet
+        self.dest_lang = dest_lang
+        self.filtered = Counter()
+        self._verdicts = {}
+        self._columns = {}
+
+    def __call__(self, column, text):
+        override = self._columns.get(column)
+        if override is None:
+            override = self._columns[column] = self.classifier.column_override(self.sheet, column) or ""
+        if override == TRANSLATE:
+            return None
+        if override == SKIP:
+            reason = "column"
+        else:
+            reason = self._verdicts.get(text, False)
+            if reason is False:
+                reason = self.classifier.classify(text)
+                if reason is None and self.classifier.in_language(text, self.dest_lang):
+                    reason = "dest_language"
+                self._verdicts[text] = reason
+        if reason is not None:
+            self.filtered[reason] += 1
+        return reason
+
+
+def load_classifier(config_path=CLASSIFIER_CONFIG):
+    """The classifier configured by XSLM_CLASSIFIER_CONFIG, or the default rules."""
+    if not config_path:
+        return CellClassifier(identifier=IDENTIFIER if SKIP_TARGET_LANGUAGE else None)
+    with open(config_path) as f:
+        config = json.load(f)
+    logger.info(f"Loaded classifier configuration from {config_path}")
+    return CellClassifier.from_config(config, identifier=IDENTIFIER)
@@ -0,0 +1,87 @@
+import os
+import asyncio
+import itertools
+import httpx
+from googletrans import Translator
+from utils.logging_mech import logger
+from utils.backends import TranslationBackend
+
+DEFAULT_POOL_SIZE = int(os.environ.get("XSLM_POOL_SIZE", "4"))
+DEFAULT_MAX_CONNECTIONS = int(os.environ.get("XSLM_MAX_CONNECTIONS", "8"))
+DEFAULT_TIMEOUT = float(os.environ.get("XSLM_HTTP_TIMEOUT", "30"))
+
+
+class TranslatorPool(TranslationBackend):
+    """
+    A small pool of long-lived googletrans clients shared by a whole job.
+
+    Each client keeps its HTTP connections alive between requests, so the TLS
+    handshake is paid once per connection instead of once per row. A semaphore per
+    client lets at most `max_connections` of its requests run at a time, which keeps
+    it within httpx's keep-alive pool; the job as a whole uses at most
+    `size * max_connections`.
+    """
+
+    name = "googletrans"
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT):
+        self.size = size
+        self.max_connections = max_connections
+        self._translators = [
+            Translator(
+                timeout=httpx.Timeout(timeout),
+                raise_exception=True,  # surface HTTP errors instead of echoing the source text back
+            )
+            for _ in range(size)
+        ]
+        # googletrans makes a new semaphore for every list it translates, so the cap per client is kept here
+        self._slots = [asyncio.Semaphore(max_connections) for _ in range(size)]
+        self._cycle = itertools.cycle(list(zip(self._translators, self._slots)))
+        self.closed = False
+
+    async def translate_batch(self, texts, src, dest):
+        """
+        Translates a batch of texts on the next client of the pool and returns the translated strings.
+
+        Single-line texts of the batch travel together as one newline-joined request. If the
+        backend does not hand back the same number of lines, they are re-sent one by one.
+        """
+        if self.closed:
+            raise RuntimeError("Translator pool is closed")
+        translator, slots = next(self._cycle)
+
+        results = [None] * len(texts)
+        joinable = [idx for idx, text in enumerate(texts) if "\n" not in text]
+        separate = [idx for idx, text in enumerate(texts) if "\n" in text]
+
+        if len(joinable) > 1:
+            joined = await self._request(translator, slots, "\n".join(texts[idx] for idx in joinable), src, dest)
+            lines = joined.text.split("\n")
+            if len(lines) == len(joinable):
+                for idx, line in zip(joinable, lines):
+                    results[idx] = line
+            else:
+                logger.debug(f"Joined batch came back with {len(lines)} lines for {len(joinable)} texts, resending one by one")
+                separate.extend(joinable)
+        else:
+            separate.extend(joinable)
+
+        if separate:
+            translations = await asyncio.gather(*(self._request(translator, slots, texts[idx], src, dest) for idx in separate))
+            for idx, translation in zip(separate, translations):
+                results[idx] = translation.text
+        return results
+
+    @staticmethod
+    async def _request(translator, slots, text, src, dest):
+        # One HTTP request, holding one of its client's connection slots
+        async with slots:
+            return await translator.translate(text, src=src, dest=dest)
+
+    async def aclose(self):
+        if self.closed:
+            return
+        self.closed = True
+        for translator in self._translators:
+            await translator.client.aclose()
+        logger.debug(f"Closed translator pool of {self.size} clients")
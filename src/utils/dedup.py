@@ -0,0 +1,328 @@
+import time
+import asyncio
+from collections import deque
+from utils.logging_mech import logger
+from utils import metrics
+from utils.row_ds import CancellationException
+from utils.scheduler import RequestScheduler
+from utils.batching import pack_batches, DEFAULT_MAX_BATCH_CHARS, DEFAULT_MAX_BATCH_ITEMS
+from utils.glossary import load_glossary
+from utils.segmenter import MAX_SEGMENT_CHARS, segment, reassemble
+from utils.resilience import MAX_RETRIES, HEDGE_BUDGET_MIN, HEDGE_BUDGET_RATIO, RetryBudget, LatencyTracker, backoff_delay, is_retryable
+
+
+class TranslationDeduplicator:
+    """
+    Translates every unique string once per job.
+
+    One instance is shared by all sheets of a workbook (or all files of a folder job).
+    Results are memoised by (src, dest, text); a string that is already being
+    translated by another sheet or file is awaited on the same future instead of
+    being sent a second time. When a translation memory is given, new strings are
+    looked up there before going to the network and fresh translations are stored back.
+    New strings from every row and sheet are packed into batches bounded by
+    `max_batch_chars`/`max_batch_items`, and every request goes through the job's
+    RequestScheduler; results are scattered back to their callers through the futures.
+
+    With a glossary (by default the one named by XSLM_GLOSSARY, see utils.glossary), strings
+    that are exactly a glossary term never leave the process, and the terms inside other
+    strings are masked before the memory lookup and the request, then restored.
+    Strings that differ only in their masked terms share one request and memory entry.
+
+    Strings longer than `max_segment_chars` (or than the backend takes in one request) are
+    cut into segments at line and sentence boundaries (see utils.segmenter). The segments are
+    deduplicated, looked up, batched and sent like any other string, and the translations are
+    joined back together once all the segments are in.
+
+    A failing batch is retried with jittered exponential backoff, then split in half until
+    the strings that keep failing are isolated; a request running past the usual latency
+    (see utils.resilience) is hedged with a second one. Retries, halves and the scheduler's
+    re-queues of throttled requests draw on one RetryBudget, hedges on a smaller one of their
+    own. Strings that cannot be translated resolve to their source text and are listed in
+    `failed`; only cancellation fails the callers.
+    """
+
+    def __init__(self, max_batch_chars=DEFAULT_MAX_BATCH_CHARS, max_batch_items=DEFAULT_MAX_BATCH_ITEMS,
+                 translation_memory=None, scheduler=None, glossary=None, max_retries=MAX_RETRIES, retry_budget=None,
+                 latency=None, max_segment_chars=MAX_SEGMENT_CHARS):
+        self.max_batch_chars = max_batch_chars
+        self.max_batch_items = max_batch_items
+        self.translation_memory = translation_memory
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.glossary = glossary if glossary is not None else load_glossary()
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self.hedge_budget = RetryBudget(initial=HEDGE_BUDGET_MIN, ratio=HEDGE_BUDGET_RATIO)
+        self.latency = latency if latency is not None else LatencyTracker()
+        self.max_segment_chars = max_segment_chars
+        self._futures = {}
+        self.failed = []  # (src, dest, text) of the strings left untranslated
+        self.requested = 0
+        self.sent = 0
+        self.batches = 0
+        self.hedged = 0
+        self.segmented = 0
+        self._segments = set()  # keys of the futures made for segments rather than for requested strings
+
+    async def translate(self, texts, src, dest, cancellation_token, translator, progress=None):
+        """
+        Returns the translations of `texts`, in order, sending only strings not seen before.
+
+        `progress`, when given, is called with the fraction of this call's new strings translated so far.
+        """
+        loop = asyncio.get_running_loop()
+        owned = []
+        pending = []
+
+        for text in texts:
+            key = (src, dest, text)
+            future = self._futures.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._futures[key] = future
+                owned.append(text)
+            pending.append(future)
+
+        self.requested += len(texts)
+        metrics.STRINGS_REQUESTED.inc(len(texts))
+        metrics.DEDUP_HITS.inc(len(texts) - len(owned))
+
+        # What is looked up and sent: each string, or its masked form, with the strings it stands for
+        targets = self._apply_glossary(owned, src, dest) if owned and self.glossary else {text: [(text, None)] for text in owned}
+        owned = list(targets)
+
+        # Never pack beyond what the backend declares it accepts
+        max_chars = min(self.max_batch_chars, translator.max_batch_chars)
+        max_items = min(self.max_batch_items, translator.max_batch_items)
+        assemblies = []
+        if any(len(text) > min(max_chars, self.max_segment_chars) for text in owned):
+            owned, assemblies = self._segment(owned, src, dest, min(max_chars, self.max_segment_chars), targets)
+
+        if owned and self.translation_memory is not None:
+            # SQLite reads block, so they run in a thread and the event loop keeps serving the other jobs
+            remembered = await asyncio.to_thread(self.translation_memory.get_many, owned, src, dest)
+            for text, translation in remembered.items():
+                self._deliver(targets, text, translation, src, dest)
+            metrics.CACHE_HITS.inc(len(remembered))
+            metrics.CACHE_MISSES.inc(len(owned) - len(remembered))
+            owned = [text for text in owned if text not in remembered]
+
+        on_batch = None
+        if owned and progress is not None:
+            total, done = len(owned), 0
+
+            def on_batch(size):
+                nonlocal done
+                done += size
+                progress(done / total)
+
+        try:
+            if owned:
+                batches = deque(pack_batches(owned, max_chars, max_items))
+                # A few workers drain the batches, instead of one coroutine per batch waiting on the scheduler
+                workers = min(len(batches), self.scheduler.max_concurrency)
+                await asyncio.gather(*(self._drain(batches, src, dest, cancellation_token, translator, targets, on_batch) for _ in range(workers)))
+            for text, segments, futures in assemblies:
+                self._deliver(targets, text, reassemble(segments, await asyncio.gather(*futures)), src, dest)
+        except BaseException as exc:
+            # The long strings wait on their segments, which may also fail in another call
+            if assemblies:
+                self._fail([text for text, _, _ in assemblies], src, dest, exc, targets)
+            raise
+
+        return list(await asyncio.gather(*pending))
+
+    def _apply_glossary(self, texts, src, dest):
+        """Resolves the strings that are glossary terms; returns {text to send: [(string, replacements)]} for the others."""
+        targets = {}
+        resolved = masked = 0
+        for text in texts:
+            translation = self.glossary.resolve(text, dest)
+            if translation is None:
+                sent, replacements = self.glossary.mask(text, dest)
+                if replacements is None or any(ch.isalpha() for ch in sent):
+                    targets.setdefault(sent, []).append((text, replacements))
+                    masked += replacements is not None
+                    continue
+                # Nothing but terms, numbers and punctuation: no request needed
+                translation, _ = self.glossary.restore(sent, replacements)
+            self._futures[(src, dest, text)].set_result(translation)
+            resolved += 1
+        metrics.GLOSSARY_RESOLVED.inc(resolved)
+        metrics.GLOSSARY_MASKED.inc(masked)
+        return targets
+
+    def _segment(self, texts, src, dest, max_chars, targets):
+        """
+        Replaces the strings longer than `max_chars` with their segments; returns the strings to
+        send and, for each long string, its segments and the futures of their translations.
+        """
+        loop = asyncio.get_running_loop()
+        to_send = []
+        assemblies = []
+        for text in texts:
+            if len(text) <= max_chars:
+                to_send.append(text)
+                continue
+            segments = segment(text, max_chars)
+            futures = []
+            for _, core, _ in segments:
+                if not core:
+                    continue
+                key = (src, dest, core)
+                future = self._futures.get(key)
+                if future is None:
+                    future = loop.create_future()
+                    self._futures[key] = future
+                    self._segments.add(key)
+                    if core not in targets:
+                        to_send.append(core)
+                    targets.setdefault(core, []).append((core, None))
+                futures.append(future)
+            assemblies.append((text, segments, futures))
+            metrics.SEGMENTS.inc(len(futures))
+        self.segmented += len(assemblies)
+        metrics.CELLS_SEGMENTED.inc(len(assemblies))
+        return to_send, assemblies
+
+    def _deliver(self, targets, sent, translation, src, dest):
+        for text, replacements in targets[sent]:
+            if replacements is not None:
+                translation_of_text, lost = self.glossary.restore(translation, replacements)
+                if lost:
+                    metrics.GLOSSARY_LOST.inc(lost)
+                    logger.warning(f"The engine dropped {lost} glossary placeholder(s) translating {text!r}")
+            else:
+                translation_of_text = translation
+            self._futures[(src, dest, text)].set_result(translation_of_text)
+
+    async def _drain(self, batches, src, dest, cancellation_token, translator, targets, on_batch=None):
+        while batches:
+            batch = batches.popleft()
+            try:
+                await self._send_batch(batch, src, dest, cancellation_token, translator, targets)
+            except BaseException as exc:
+                # Fail the batches nobody will pick up anymore, so their waiters do not hang
+                while batches:
+                    self._fail(batches.popleft(), src, dest, exc, targets)
+                raise
+            if on_batch is not None:
+                on_batch(len(batch))
+
+    async def _send_batch(self, batch, src, dest, cancellation_token, translator, targets):
+        self.retry_budget.earn()
+        self.hedge_budget.earn()
+        try:
+            results = await self._translate_resilient(batch, src, dest, cancellation_token, translator)
+            self.sent += len(batch)
+            self.batches += 1
+            translated = []
+            for text, result in zip(batch, results):
+                if result is None:
+                    self._give_up(targets, text, src, dest)
+                else:
+                    self._deliver(targets, text, result, src, dest)
+                    translated.append((text, result))
+        except BaseException as exc:
+            self._fail(batch, src, dest, exc, targets)
+            raise
+        if self.translation_memory is not None and translated:
+            await asyncio.to_thread(self.translation_memory.put_many, translated, src, dest)
+
+    async def _translate_resilient(self, batch, src, dest, cancellation_token, translator):
+        """The translations of `batch`, with None for the strings that could not be translated."""
+        attempt = 0
+        while True:
+            if cancellation_token.is_cancelled():
+                raise CancellationException
+            try:
+                return await self._request(batch, src, dest, translator)
+            except Exception as exc:
+                error = exc
+            if attempt < self.max_retries and is_retryable(error) and self.retry_budget.spend():
+                attempt += 1
+                delay = backoff_delay(attempt)
+                metrics.RETRIES.inc()
+                logger.debug(f"Batch of {len(batch)} strings failed ({error!r}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            if len(batch) > 1 and self.retry_budget.spend():
+                # Split to isolate the strings the backend chokes on; the halves get their own retries
+                metrics.BATCH_SPLITS.inc()
+                middle = len(batch) // 2
+                halves = await asyncio.gather(
+                    self._translate_resilient(batch[:middle], src, dest, cancellation_token, translator),
+                    self._translate_resilient(batch[middle:], src, dest, cancellation_token, translator),
+                )
+                return halves[0] + halves[1]
+            logger.warning(f"Giving up on {len(batch)} string(s) after {attempt + 1} attempt(s): {error!r}")
+            return [None] * len(batch)
+
+    async def _request(self, batch, src, dest, translator):
+        """One request through the scheduler, hedged with a second one if it outlasts the latency percentile."""
+        metrics.BATCH_ITEMS.observe(len(batch))
+        metrics.BATCH_CHARS.observe(sum(len(text) for text in batch))
+        started = asyncio.Event()
+
+        async def call():
+            # Timed from when the scheduler lets it go, so time spent waiting for a slot does not trigger hedges
+            started.set()
+            begin = time.perf_counter()
+            result = await translator.translate_batch(batch, src, dest)
+            self.latency.observe(time.perf_counter() - begin)
+            return result
+
+        delay = self.latency.hedge_delay()
+        if delay is None:
+            return await self.scheduler.run(call, retry_budget=self.retry_budget)
+        primary = asyncio.ensure_future(self.scheduler.run(call, retry_budget=self.retry_budget))
+        waiter = asyncio.ensure_future(started.wait())
+        tasks = {primary, waiter}
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            tasks.discard(waiter)
+            waiter.cancel()
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.hedge_budget.spend():
+                return await primary
+            self.hedged += 1
+            metrics.HEDGED.inc()
+            tasks.add(asyncio.ensure_future(self.scheduler.run(translator.translate_batch, batch, src, dest, retry_budget=self.hedge_budget)))
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    return primary.result()  # both failed: raise the first request's error
+                tasks = pending
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _give_up(self, targets, sent, src, dest):
+        # The strings keep their source text; their futures are dropped so a later call may try again
+        for text, _ in targets[sent]:
+            self.failed.append((src, dest, text))
+            future = self._futures.pop((src, dest, text), None)
+            if future is not None and not future.done():
+                future.set_result(text)
+        metrics.STRINGS_FAILED.inc(len(targets[sent]))
+
+    def _fail(self, batch, src, dest, exc, targets):
+        # Forget the failed strings so a later call can retry them, and wake up any waiters.
+        for text, _ in (target for sent in batch for target in targets[sent]):
+            future = self._futures.pop((src, dest, text), None)
+            if future is None or future.done():
+                continue
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                future.exception()  # marks the exception as retrieved for unattended waiters
+        logger.debug(f"Batch of {len(batch)} strings failed: {exc!r}")
+
+    def stats(self):
+        unique = sum(1 for key in self._futures if key not in self._segments)
+        return {"requested": self.requested, "unique": unique, "sent": self.sent, "batches": self.batches, "hedged": self.hedged,
+                "segmented": self.segmented, "segments": len(self._segments), "retries_spent": self.retry_budget.spent, "failed": len(self.failed)}
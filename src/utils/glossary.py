@@ -0,0 +1,224 @@
+"""
+Glossary of fixed translations and do-not-translate terms, applied before anything is sent.
+
+A cell that is exactly a glossary term is resolved locally. Terms inside longer cells are
+found with an Aho-Corasick automaton, in one pass over the text however many terms there
+are. They are replaced by numbered placeholders (⟦0⟧, ⟦1⟧, ...) before the text is sent and
+put back into the translation afterwards: do-not-translate terms as they were written, the
+others as their fixed translation for the destination language.
+
+The glossary is read from the file named by XSLM_GLOSSARY, either JSON:
+
+    {
+        "case_sensitive": false,
+        "do_not_translate": ["ACME Turbo", "SKU"],
+        "terms": {"purchase order": {"de": "Bestellung", "fr": "bon de commande"}}
+    }
+
+or CSV with a `term` column and one column per language; rows with no translation are
+do-not-translate terms:
+
+    term,de,fr
+    purchase order,Bestellung,bon de commande
+    ACME Turbo,,
+"""
+import os
+import re
+import csv
+import json
+from functools import lru_cache
+from collections import deque
+from utils.logging_mech import logger
+
+GLOSSARY_PATH = os.environ.get("XSLM_GLOSSARY")
+
+PLACEHOLDER = "⟦{}⟧"
+# Engines sometimes add spaces inside the brackets
+_PLACEHOLDER_RE = re.compile(r"⟦\s*(\d+)\s*⟧")
+
+
+def _word_char(ch):
+    # Scripts written without spaces have no word boundaries to respect
+    return (ch.isalnum() or ch == "_") and ch < "\u3000"
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton over a set of terms.
+
+    `find` returns the leftmost-longest, non-overlapping occurrences that start and end on
+    word boundaries, as (start, end, term) tuples.
+    """
+
+    def __init__(self, terms):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]  # lengths of the terms ending at each state
+        self._terms = {}
+        for term in terms:
+            if term:
+                self._add(term)
+        self._build()
+
+    def _add(self, term):
+        state = 0
+        for ch in term:
+            following = self._goto[state].get(ch)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][ch] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = following
+        self._out[state] = (len(term),)
+        self._terms[term] = True
+
+    def _build(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, following in self._goto[state].items():
+                pending.append(following)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[following] = target if target != following else 0
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+
+    def __len__(self):
+        return len(self._terms)
+
+    def find(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length in out[state]:
+                start = end - length
+                if start > 0 and _word_char(text[start - 1]) and _word_char(text[start]):
+                    continue
+                if end < len(text) and _word_char(text[end]) and _word_char(text[end - 1]):
+                    continue
+                found.append((start, end))
+        if not found:
+            return []
+        found.sort(key=lambda span: (span[0], -span[1]))
+        matches = []
+        position = 0
+        for start, end in found:
+            if start >= position:
+                matches.append((start, end, text[start:end]))
+                position = end
+        return matches
+
+
+class Glossary:
+    """
+    Terms with a fixed translation per language ({term: {lang: translation}}) or none at all
+    (do-not-translate, {term: None}). Matching ignores case unless `case_sensitive`.
+    """
+
+    def __init__(self, terms=None, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.terms = {}
+        for term, translations in (terms or {}).items():
+            term = term.strip()
+            if term:
+                self.terms[self._key(term)] = {lang.lower(): value for lang, value in translations.items() if value} if translations else None
+        self.matcher = TermMatcher(self.terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _key(self, text):
+        if self.case_sensitive:
+            return text
+        folded = text.lower()
+        # A few characters lower-case to two; keep those as they are so offsets stay aligned
+        return folded if len(folded) == len(text) else "".join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+    def _replacement(self, key, original, dest):
+        """What a term becomes in `dest`: itself when it is not translated, its fixed translation, or None when it has none for `dest`."""
+        translations = self.terms.get(key, False)
+        if translations is False:
+            return None
+        if translations is None:
+            return original
+        return translations.get(dest.lower())
+
+    def resolve(self, text, dest):
+        """The translation of a cell that is exactly a glossary term (surrounding spaces kept), else None."""
+        stripped = text.strip()
+        replacement = self._replacement(self._key(stripped), stripped, dest)
+        if replacement is None:
+            return None
+        start = text.index(stripped)
+        return text[:start] + replacement + text[start + len(stripped):]
+
+    def mask(self, text, dest):
+        """
+        `text` with its glossary terms replaced by placeholders, and the values to restore them
+        with; (text, None) when it holds no term applying to `dest`.
+        """
+        parts = []
+        replacements = []
+        position = 0
+        for start, end, key in self.matcher.find(self._key(text)):
+            replacement = self._replacement(key, text[start:end], dest)
+            if replacement is None:
+                continue
+            parts.append(text[position:start])
+            parts.append(PLACEHOLDER.format(len(replacements)))
+            replacements.append(replacement)
+            position = end
+        if not replacements:
+            return text, None
+        parts.append(text[position:])
+        return "".join(parts), replacements
+
+    @staticmethod
+    def restore(translation, replacements):
+        """Puts the masked terms back into `translation`; returns it with the number of placeholders the engine lost."""
+        seen = set()
+
+        def put_back(match):
+            index = int(match.group(1))
+            if index >= len(replacements):
+                return match.group(0)
+            seen.add(index)
+            return replacements[index]
+
+        restored = _PLACEHOLDER_RE.sub(put_back, translation)
+        return restored, len(replacements) - len(seen)
+
+    @classmethod
+    def from_file(cls, path):
+        if path.lower().endswith(".csv"):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                rows = list(csv.DictReader(f))
+            terms = {}
+            for row in rows:
+                term = row.pop("term", None) or ""
+                translations = {lang.strip(): value.strip() for lang, value in row.items() if lang and value and value.strip()}
+                terms[term] = translations or None
+            return cls(terms)
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        terms = dict.fromkeys(config.get("do_not_translate", []))
+        terms.update(config.get("terms", {}))
+        return cls(terms, case_sensitive=config.get("case_sensitive", False))
+
+
+@lru_cache(maxsize=None)
+def load_glossary(path=GLOSSARY_PATH):
+    """The glossary in the file named by XSLM_GLOSSARY, loaded once; None when none is configured."""
+    if not path:
+        return None
+    glossary = Glossary.from_file(path)
+    logger.info(f"Loaded {len(glossary)} glossary terms from {path}")
+    return glossary
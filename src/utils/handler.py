@@ -1,87 +1,803 @@
 import os
+import json
 import asyncio
+import multiprocessing
 from pathlib import Path
-from openpyxl import load_workbook
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook, load_workbook
 
-from utils.logging_mech import logger as logging
-from utils.row_ds import TranslateRow, CancellationException
+from utils.logging_mech import logger as logging, log_context
+from utils.row_ds import SheetCells, CancellationException, no_translate_value
+from utils.dedup import TranslationDeduplicator
+from utils.backends import job_translator
+from utils.timing import phase
+from utils.shared_strings import SHARED_STRINGS_PART, has_inline_strings, read_shared_strings, write_patched_workbook
+from utils.pipeline import extract_cells_counted, apply_translations
+from utils.journal import JobJournal, JOURNAL_MEMORY_NAME, file_digest
+from utils.tm_cache import TranslationMemory
+from utils.incremental import previous_digests, carried_values, changed_cells, apply_incremental, write_manifest
+from utils import metrics
+from utils.classifier import load_classifier
+from utils.langid import IDENTIFIER
+from utils.buffers import WorkbookBuffer, is_buffer, open_source, source_name, source_size
 
-async def translate_sheet(ws, src_lang, dest_lang, cancellation_token, log_queue):
-    """Translates all cells in a sheet asynchronously."""
-    ws_title = ws.title
-    logging.info(f"Started translation of sheet {ws_title}")
-    tasks = []
-    for row in ws.iter_rows():
-        t_row = TranslateRow(row)
-        tasks.append(asyncio.create_task(t_row.perform_translation(src_lang, dest_lang, cancellation_token)))
+MAX_CONCURRENT_FILES = int(os.environ.get("XSLM_MAX_CONCURRENT_FILES", "4"))
+# Folder jobs parse and save workbooks in this many processes, with at most
+# PIPELINE_DEPTH workbooks queued between two stages
+PROCESS_WORKERS = int(os.environ.get("XSLM_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+PIPELINE_DEPTH = int(os.environ.get("XSLM_PIPELINE_DEPTH", "4"))
+# Engine used when the caller does not pass a translator; see utils.backends.BACKENDS.
+# e.g. XSLM_BACKEND=stub XSLM_BACKEND_OPTIONS='{"latency": 0.2, "error_rate": 0.01}' for offline runs
+TRANSLATION_BACKEND = os.environ.get("XSLM_BACKEND", "googletrans")
+BACKEND_OPTIONS = json.loads(os.environ.get("XSLM_BACKEND_OPTIONS", "{}"))
+# Workbook engine used by translate_file: "openpyxl", "streaming", "shared_strings", or "auto",
+# which picks streaming for files of at least STREAMING_THRESHOLD_BYTES and openpyxl otherwise
+TRANSLATION_ENGINE = os.environ.get("XSLM_ENGINE", "auto")
+# Files at least this large are translated in streaming mode (see translate_workbook_streaming)
+STREAMING_THRESHOLD_BYTES = int(float(os.environ.get("XSLM_STREAMING_THRESHOLD_MB", "50")) * 1024 * 1024)
+STREAMING_WINDOW_ROWS = int(os.environ.get("XSLM_STREAMING_WINDOW_ROWS", "2000"))
+# Keeps numbers, dates, codes, URLs... off the network; see utils.classifier for XSLM_CLASSIFIER_CONFIG
+CLASSIFIER = load_classifier()
+# With "auto" as the source language, detect it offline per sheet (see utils.langid) so
+# each batch is sent with a concrete source language; sheets it is unsure of stay "auto"
+RESOLVE_AUTO = os.environ.get("XSLM_RESOLVE_AUTO", "0") == "1"
+
+def output_path_for(input_file, output_dir=None, dest_lang=None):
+    """
+    Where the translation of `input_file` is written: next to it, or in `output_dir` (created
+    if missing) when given, prefixed with translated_ (translated_<dest_lang>_ when given).
+    """
+    if output_dir is None:
+        output_dir = os.path.dirname(input_file)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+    prefix = "translated_" if dest_lang is None else f"translated_{dest_lang}_"
+    return os.path.join(output_dir, f"{prefix}{os.path.basename(input_file)}")
+
+def fan_out(dest_lang):
+    """The languages of a list (or tuple) `dest_lang`, duplicates dropped, or None for a single language."""
+    if isinstance(dest_lang, (list, tuple)):
+        return list(dict.fromkeys(dest_lang))
+    return None
+
+def output_paths_for(input_file, dest_lang, output_dir=None):
+    """
+    {language: output path}: translated_<name> for a single `dest_lang`, or one
+    translated_<language>_<name> per language when `dest_lang` is a list.
+    An in-memory input (see utils.buffers) gets WorkbookBuffers of those names instead.
+    """
+    dest_langs = fan_out(dest_lang)
+    if is_buffer(input_file):
+        name = os.path.basename(source_name(input_file))
+        if dest_langs is None:
+            return {dest_lang: WorkbookBuffer(f"translated_{name}")}
+        return {lang: WorkbookBuffer(f"translated_{lang}_{name}") for lang in dest_langs}
+    if dest_langs is None:
+        return {dest_lang: output_path_for(input_file, output_dir)}
+    return {lang: output_path_for(input_file, output_dir, lang) for lang in dest_langs}
+
+def engine_result(outputs, dest_lang):
+    """What an engine returns: the output path for a single language, {language: path} for a list."""
+    return outputs if fan_out(dest_lang) is not None else outputs[dest_lang]
+
+class ProgressSlice:
+    """Maps a step's progress (0 to 1) onto the [start, end] span of a job's progress bar."""
+
+    def __init__(self, progress_bar, start, end):
+        self.progress_bar = progress_bar
+        self.start = start
+        self.end = end
+
+    def progress(self, value):
+        self.progress_bar.progress(self.start + (self.end - self.start) * value)
+
+class FolderProgress:
+    """
+    A folder job's progress bar: the files done, plus the fraction done of the files being
+    translated, so files finishing in any order never move it backwards.
+    """
+
+    def __init__(self, progress_bar, total_files):
+        self.progress_bar = progress_bar
+        self.total_files = max(total_files, 1)
+        self.done = 0
+        self.in_flight = {}
+
+    def file_bar(self, input_file):
+        """The progress bar to hand to translate_file for one file."""
+        return _FileProgress(self, input_file)
+
+    def update(self, input_file, value):
+        self.in_flight[input_file] = min(value, 1.0)
+        self._report()
+
+    def file_done(self, input_file):
+        self.in_flight.pop(input_file, None)
+        self.done += 1
+        self._report()
+
+    def _report(self):
+        self.progress_bar.progress((self.done + sum(self.in_flight.values())) / self.total_files)
+
+class _FileProgress:
+    def __init__(self, folder_progress, input_file):
+        self.folder_progress = folder_progress
+        self.input_file = input_file
+
+    def progress(self, value):
+        self.folder_progress.update(self.input_file, value)
+
+class FolderResults(dict):
+    """
+    translate_folder's {input_file: output file} (or {input_file: {language: output file}}).
+
+    `partial` has the same shape for the files that were written with strings left in the
+    source language, giving how many, so callers can tell them from fully translated ones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.partial = {}
+
+def prepare_sheet(ws, classifier=None, dest_lang=None):
+    """Classifies every cell of a sheet so its translatable strings are known up front; returns its SheetCells."""
+    sheet_filter = (classifier or CLASSIFIER).sheet_filter(ws.title, dest_lang)
+    cells = SheetCells.from_rows(ws.iter_rows(), ws.title, sheet_filter)
+    metrics.record_cells(cells.scanned, len(cells))
+    report_filtered(ws.title, sheet_filter.filtered)
+    return cells
+
+def _prepare_workbook(wb, classifier, filter_lang, src_lang, dest_lang):
+    """prepare_sheet for every sheet, and each sheet's source language; ({sheet: SheetCells}, {sheet: source language})."""
+    sheet_cells = {sheet: prepare_sheet(wb[sheet], classifier, filter_lang) for sheet in wb.sheetnames}
+    sheet_src = {sheet: resolve_source_language(cells.texts, src_lang, dest_lang, f"sheet {sheet}") for sheet, cells in sheet_cells.items()}
+    return sheet_cells, sheet_src
+
+def report_filtered(sheet, filtered):
+    """Logs and counts the cells the classifier kept off the network, by reason."""
+    total = sum(filtered.values())
+    if total:
+        metrics.CELLS_FILTERED.inc(total)
+        logging.info(f"Classifier filtered {total} cells of sheet {sheet}: {dict(filtered)}")
 
-    translated_values = await asyncio.gather(*tasks)
+def filter_sheets(sheets, classifier=None, dest_lang=None):
+    """Applies the classifier to extract_cells' result, reporting what it filtered sheet by sheet."""
+    classifier = classifier or CLASSIFIER
+    filtered_sheets = []
+    for title, rows, cols, texts in sheets:
+        rows, cols, texts, filtered = classifier.filter_sheet(title, rows, cols, texts, dest_lang)
+        report_filtered(title, filtered)
+        filtered_sheets.append((title, rows, cols, texts))
+    return filtered_sheets
 
-    for row, row_values in zip(ws.iter_rows(), translated_values):
-        for cell, value in zip(row, row_values):
-            if value is not None:  # Skip cancelled translations
-                cell.value = value
+def resolve_source_language(texts, src_lang, dest_lang, where):
+    """With RESOLVE_AUTO, the language most of `texts` are written in when `src_lang` is "auto" and it is clear."""
+    if src_lang != "auto" or not RESOLVE_AUTO:
+        return src_lang
+    detected = IDENTIFIER.dominant_language(texts)
+    if detected is None or (isinstance(dest_lang, str) and detected.lower() == dest_lang.lower()):
+        return src_lang
+    logging.info(f"Detected source language {detected} for {where}")
+    return detected
 
-    logging.info(f"Ended translation of sheet {ws_title}")
+async def translate_lookups(deduplicator, texts_by_source, dest_langs, cancellation_token, translator, classifier=None, progress=None):
+    """
+    Translates {src_lang: texts} into every language of `dest_langs` concurrently, through one
+    deduplicator and so one scheduler, leaving out the texts already in a destination language.
+
+    Returns {(src_lang, dest_lang): {text: translation}}. `progress` gets the overall fraction done.
+    """
+    classifier = classifier or CLASSIFIER
+    work = await asyncio.to_thread(lambda: {(src, dest): [text for text in texts if not classifier.in_language(text, dest)]
+                                            for src, texts in texts_by_source.items() for dest in dest_langs})
+    for (src, dest), texts in work.items():
+        kept = len(texts_by_source[src]) - len(texts)
+        if kept:
+            logging.info(f"{kept} strings already in {dest} are kept as they are")
+    total = sum(len(texts) for texts in work.values()) or 1
+    done = dict.fromkeys(work, 0.0)
+
+    def on_progress(key, fraction):
+        done[key] = fraction * len(work[key])
+        if progress is not None:
+            progress(sum(done.values()) / total)
+
+    async def translate_one(key):
+        src, dest = key
+        texts = work[key]
+        translations = await deduplicator.translate(texts, src, dest, cancellation_token, translator,
+                                                    progress=lambda fraction: on_progress(key, fraction))
+        return dict(zip(texts, translations))
+
+    return dict(zip(work, await asyncio.gather(*(translate_one(key) for key in work))))
+
+def unique_strings(sheet_cells):
+    """Returns the distinct translatable strings of the given SheetCells, in first-seen order."""
+    if len(sheet_cells) == 1:
+        return list(sheet_cells[0].texts)
+    return list(dict.fromkeys(text for cells in sheet_cells for text in cells.texts))
+
+async def translate_sheet(ws, src_lang, dest_lang, cancellation_token, log_queue, deduplicator=None, cells=None, translator=None, classifier=None, lookup=None):
+    """
+    Translates all cells in a sheet asynchronously; `cells` is its SheetCells when already prepared.
+
+    With `lookup` ({text: translation}, e.g. from a workbook-wide pass) nothing is sent: the
+    sheet is written from it.
+    """
+    ws_title = ws.title
+    with log_context(sheet=ws_title):
+        logging.info(f"Started translation of sheet {ws_title}")
+        if deduplicator is None:
+            deduplicator = TranslationDeduplicator()
+        if cells is None:
+            cells = await asyncio.to_thread(prepare_sheet, ws, classifier, dest_lang)
+        if lookup is not None:
+            translations = [lookup.get(text) for text in cells.texts]
+        else:
+            src_lang = resolve_source_language(cells.texts, src_lang, dest_lang, f"sheet {ws_title}")
+            async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+                # Every unique string goes out once, aligned with the sheet's string table
+                translations = await deduplicator.translate(cells.texts, src_lang, dest_lang, cancellation_token, translator)
+
+        cells.write(ws, translations)
+        metrics.CELLS_TRANSLATED.inc(cells.translated_count(translations))
+
+        logging.info(f"Ended translation of sheet {ws_title}")
     await log_queue.put(f"Worksheet '{ws_title}' translated.")
 
-async def translate_workbook(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False):
-    """Translates an Excel workbook asynchronously."""
-    wb = load_workbook(input_file, keep_vba=True)  # Macros are preserved
-    output_file = os.path.join(os.path.dirname(input_file), f"translated_{os.path.basename(input_file)}")
+async def translate_workbook(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False, deduplicator=None, translator=None, timings=None, output_dir=None, classifier=None):
+    """
+    Translates an Excel workbook asynchronously. Phase durations are added to `timings` when given.
+
+    `dest_lang` may be a list: the workbook is then parsed once, translated into every
+    language concurrently and saved once per language; {language: output path} is returned.
+    """
+    loop = asyncio.get_running_loop()
+    # Loading and saving run in a thread, so the event loop keeps serving requests and heartbeats meanwhile
+    with phase(timings, "load"):
+        wb = await loop.run_in_executor(None, partial(load_workbook, input_file, keep_vba=True))  # Macros are preserved
+    outputs = output_paths_for(input_file, dest_lang, output_dir)
+    if deduplicator is None:
+        deduplicator = TranslationDeduplicator()
+    dest_langs = fan_out(dest_lang)
+    # With several languages, text in one of them is only kept for that language (see translate_lookups)
+    filter_lang = dest_lang if dest_langs is None else None
+
+    # Collect the workbook-wide set of unique strings before anything is sent
+    with phase(timings, "extract"):
+        # Classification and language detection are CPU work, kept off the event loop like the load
+        sheet_cells, sheet_src = await asyncio.to_thread(_prepare_workbook, wb, classifier, filter_lang, src_lang, dest_lang)
+    if dest_langs is not None:
+        return await _translate_workbook_languages(wb, outputs, sheet_cells, sheet_src, dest_langs, cancellation_token, log_queue, progress_bar,
+                                                   deduplicator, translator, timings, classifier)
+
+    with phase(timings, "extract"):
+        # One pass per source language, so every batch sent is in a single language
+        language_cells = {}
+        for sheet, cells in sheet_cells.items():
+            language_cells.setdefault(sheet_src[sheet], []).append(cells)
+        language_texts = {lang: unique_strings(cells) for lang, cells in language_cells.items()}
+
+    with phase(timings, "translate"):
+        async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+            # Sending the strings is nearly all of the work, so it drives the first 90% of the bar
+            total_texts = sum(len(texts) for texts in language_texts.values()) or 1
+            sent = 0
+            lookups = {}
+            for lang, texts in language_texts.items():
+                translations = await deduplicator.translate(texts, lang, dest_lang, cancellation_token, translator,
+                                                            progress=lambda done, sent=sent, share=len(texts): progress_bar.progress(0.9 * (sent + share * done) / total_texts))
+                lookups[lang] = dict(zip(texts, translations))
+                sent += len(texts)
+
+            tasks = []
+            total_sheets = len(wb.sheetnames)
+
+            for sheet in wb.sheetnames:
+                ws = wb[sheet]
+                tasks.append(asyncio.create_task(translate_sheet(ws, sheet_src[sheet], dest_lang, cancellation_token, log_queue, deduplicator=deduplicator, cells=sheet_cells[sheet], translator=translator, lookup=lookups[sheet_src[sheet]])))
+
+            for progress, task in enumerate(asyncio.as_completed(tasks), start=1):
+                await task
+                progress_bar.progress(0.9 + 0.1 * progress / total_sheets)
+
+    with phase(timings, "save"):
+        await loop.run_in_executor(None, wb.save, outputs[dest_lang])
+    return outputs[dest_lang]
+
+async def _translate_workbook_languages(wb, outputs, sheet_cells, sheet_src, dest_langs, cancellation_token, log_queue, progress_bar, deduplicator, translator, timings, classifier):
+    """translate_workbook for a list of languages: one translation pass for all of them, then one save per language."""
+    source_cells = {}
+    for sheet, cells in sheet_cells.items():
+        source_cells.setdefault(sheet_src[sheet], []).append(cells)
+    texts_by_source = {src: unique_strings(cells) for src, cells in source_cells.items()}
+
+    with phase(timings, "translate"):
+        async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+            lookups = await translate_lookups(deduplicator, texts_by_source, dest_langs, cancellation_token, translator, classifier,
+                                              progress=lambda done: progress_bar.progress(0.8 * done))
+
+    for saved, lang in enumerate(dest_langs, start=1):
+        with phase(timings, "save"):
+            translated = 0
+            for sheet, cells in sheet_cells.items():
+                lookup = lookups[(sheet_src[sheet], lang)]
+                translations = [lookup.get(text) for text in cells.texts]
+                # Writes every translatable cell, so nothing of the previous language is left
+                cells.write(wb[sheet], translations)
+                translated += cells.translated_count(translations)
+            await asyncio.get_running_loop().run_in_executor(None, wb.save, outputs[lang])
+        metrics.CELLS_TRANSLATED.inc(translated)
+        await log_queue.put(f"Workbook translated into {lang}.")
+        progress_bar.progress(0.8 + 0.2 * saved / len(dest_langs))
+    return outputs
 
-    tasks = []
-    total_sheets = len(wb.sheetnames)
-    progress = 0
+async def _translate_window(rows, out_sheets, src_lang, dest_lang, cancellation_token, deduplicator, translator, timings, sheet_filter, classifier=None):
+    """
+    Translates one window of rows and appends it to the write-only sheet of each language
+    in `out_sheets`; returns the source language used, resolved if it was "auto".
+    """
+    with phase(timings, "extract"):
+        cells = await asyncio.to_thread(partial(SheetCells.from_rows, rows, sheet_filter=sheet_filter))
+        metrics.record_cells(cells.scanned, len(cells))
+        src_lang = resolve_source_language(cells.texts, src_lang, dest_lang, f"window of {len(rows)} rows")
 
-    for sheet in wb.sheetnames:
-        ws = wb[sheet]
-        tasks.append(asyncio.create_task(translate_sheet(ws, src_lang, dest_lang, cancellation_token, log_queue)))
-        progress += 1
-        progress_bar.progress(progress / total_sheets)
+    with phase(timings, "translate"):
+        lookups = await translate_lookups(deduplicator, {src_lang: cells.texts}, list(out_sheets), cancellation_token, translator, classifier)
+        for lang, out_ws in out_sheets.items():
+            lookup = lookups[(src_lang, lang)]
+            translations = [lookup.get(text) for text in cells.texts]
+            values = [[cell.value for cell in row] for row in rows]
+            cells.fill(values, translations)
+            for row_values in values:
+                out_ws.append(row_values)
+            metrics.CELLS_TRANSLATED.inc(cells.translated_count(translations))
+    return src_lang
 
-    await asyncio.gather(*tasks)
+async def translate_workbook_streaming(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False, deduplicator=None, translator=None, timings=None, output_dir=None, classifier=None, window_rows=STREAMING_WINDOW_ROWS):
+    """
+    Translates an Excel workbook a window of rows at a time, keeping memory flat for very large files.
 
-    if op_in_dir:
-        file_dir = os.path.dirname(input_file)
-        new_dir = os.path.join(file_dir, f"translated_files")
-        output_file = os.path.join(os.path.dirname(new_dir), f"translated_{os.path.basename(input_file)}")
+    Rows are read with openpyxl's read-only iterator and appended to a write-only workbook,
+    so at most `window_rows` rows are held at once. Only cell values survive: styles, number
+    formats, column widths, merged cells, charts, images and VBA macros are dropped, and an
+    .xlsm input is written out as .xlsx since it no longer carries macros.
+    With a list of languages, each window is translated into all of them and appended to
+    one output workbook per language.
+    """
+    if deduplicator is None:
+        deduplicator = TranslationDeduplicator()
 
-    wb.save(output_file)
-    return output_file
+    outputs = output_paths_for(input_file, dest_lang, output_dir)
+    for lang, output_file in outputs.items():
+        if isinstance(output_file, WorkbookBuffer):
+            if output_file.filename.lower().endswith(".xlsm"):
+                output_file.filename = output_file.filename[:-len(".xlsm")] + ".xlsx"
+        elif output_file.lower().endswith(".xlsm"):
+            outputs[lang] = output_file[:-len(".xlsm")] + ".xlsx"
+            logging.warning(f"Streaming mode drops macros, writing {outputs[lang]}")
+    filter_lang = dest_lang if fan_out(dest_lang) is None else None
+
+    with phase(timings, "load"):
+        src_wb = load_workbook(input_file, read_only=True)
+    out_wbs = {lang: Workbook(write_only=True) for lang in outputs}
 
-async def translate_file(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False):
-    """Translates a single Excel file asynchronously."""
     try:
-        translated_file_path = await translate_workbook(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=op_in_dir)
-        await log_queue.put(f"File translated successfully: {translated_file_path}")
-        return translated_file_path
-    except CancellationException:
-        await log_queue.put("File translation cancelled.")
-    except Exception as e:
-        logging.error(f"Error translating file: {e}")
-        raise RuntimeError(f"An error occurred while translating the file: {e}")
-
-async def translate_folder(folder_path, src_lang, dest_lang, cancellation_token, log_queue, progress_bar):
-    """Translates all Excel files within a specified folder asynchronously."""
+        async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+            total_sheets = len(src_wb.sheetnames)
+            for progress, sheet in enumerate(src_wb.sheetnames, start=1):
+                ws = src_wb[sheet]
+                ws.reset_dimensions()  # exporters often write a wrong dimension tag, which would truncate rows
+                out_sheets = {lang: out_wb.create_sheet(sheet) for lang, out_wb in out_wbs.items()}
+                sheet_filter = (classifier or CLASSIFIER).sheet_filter(sheet, filter_lang)
+                logging.info(f"Started streaming translation of sheet {sheet}")
+
+                # An "auto" source is resolved from the first window that is clear about it
+                sheet_src = src_lang
+                window = []
+                for row in ws.iter_rows():
+                    window.append(row)
+                    if len(window) >= window_rows:
+                        sheet_src = await _translate_window(window, out_sheets, sheet_src, dest_lang, cancellation_token, deduplicator, translator, timings, sheet_filter, classifier)
+                        window = []
+                if window:
+                    await _translate_window(window, out_sheets, sheet_src, dest_lang, cancellation_token, deduplicator, translator, timings, sheet_filter, classifier)
+
+                report_filtered(sheet, sheet_filter.filtered)
+                logging.info(f"Ended streaming translation of sheet {sheet}")
+                await log_queue.put(f"Worksheet '{sheet}' translated.")
+                progress_bar.progress(progress / total_sheets)
+    finally:
+        src_wb.close()
+
+    with phase(timings, "save"):
+        for lang, out_wb in out_wbs.items():
+            await asyncio.get_running_loop().run_in_executor(None, out_wb.save, outputs[lang])
+    return engine_result(outputs, dest_lang)
+
+async def translate_workbook_shared_strings(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False, deduplicator=None, translator=None, timings=None, output_dir=None, classifier=None):
+    """
+    Translates an Excel workbook by patching its shared strings table inside the zip.
+
+    No worksheet is parsed and nothing is re-serialised by openpyxl: only xl/sharedStrings.xml
+    is rewritten, and every other part (vbaProject.bin included) is copied unchanged. Formula
+    cells never reference the table, and rich-text runs are translated run by run so their
+    formatting is kept. Workbooks with inline strings fall back to translate_workbook.
+    The table does not say which columns use a string, so only the classifier's text rules
+    apply here, not its column overrides. With a list of languages, the table is read once
+    and one patched copy is written per language.
+    """
+    if has_inline_strings(input_file):
+        logging.info(f"{source_name(input_file)} has inline strings, using the openpyxl engine")
+        return await translate_workbook(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=op_in_dir, deduplicator=deduplicator, translator=translator, timings=timings, output_dir=output_dir, classifier=classifier)
+
+    if deduplicator is None:
+        deduplicator = TranslationDeduplicator()
+    outputs = output_paths_for(input_file, dest_lang, output_dir)
+
+    with phase(timings, "load"):
+        table = read_shared_strings(input_file)
+    texts = table.texts if table is not None else []
+    text_filter = (classifier or CLASSIFIER).sheet_filter(SHARED_STRINGS_PART, dest_lang if fan_out(dest_lang) is None else None)
+    translatable = await asyncio.to_thread(lambda: [text for text in texts if not no_translate_value(text) and text_filter(None, text) is None])
+    to_translate = list(dict.fromkeys(translatable))
+    metrics.record_cells(len(texts), len(translatable))
+    report_filtered(SHARED_STRINGS_PART, text_filter.filtered)
+    source_lang = resolve_source_language(to_translate, src_lang, dest_lang, input_file)
+
+    with phase(timings, "translate"):
+        async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+            lookups = await translate_lookups(deduplicator, {source_lang: to_translate}, list(outputs), cancellation_token, translator, classifier,
+                                              progress=lambda done: progress_bar.progress(0.9 * done))
+
+    for lang, output_file in outputs.items():
+        lookup = lookups[(source_lang, lang)]
+        with phase(timings, "save"):
+            write_patched_workbook(input_file, output_file, table, [lookup.get(text) for text in texts])
+        metrics.CELLS_TRANSLATED.inc(sum(text in lookup for text in translatable))
+        logging.info(f"Patched {len(lookup)} unique shared strings of {source_name(input_file)} into {lang}")
+    progress_bar.progress(1.0)
+
+    await log_queue.put(f"Shared strings of '{os.path.basename(source_name(input_file))}' translated.")
+    return engine_result(outputs, dest_lang)
+
+async def translate_workbook_incremental(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False, deduplicator=None, translator=None, timings=None, output_dir=None, classifier=None, previous_source=None):
+    """
+    Re-translates only the cells whose source text changed since the existing translated output was made.
+
+    The previous revision is read from the manifest this function writes next to its output,
+    or from `previous_source` when given. Unchanged cells are copied from the previous output,
+    which keeps manual post-edits. Without a previous output or manifest, the whole workbook
+    is translated and a manifest is written for next time. With a list of languages, the
+    workbook is read once and each language's output is diffed and updated on its own.
+    """
+    loop = asyncio.get_running_loop()
+    if deduplicator is None:
+        deduplicator = TranslationDeduplicator()
+    dest_langs = fan_out(dest_lang)
+    outputs = output_paths_for(input_file, dest_lang, output_dir)
+
+    with phase(timings, "extract"):
+        sheets, scanned = await loop.run_in_executor(None, extract_cells_counted, input_file)
+        sheets = await asyncio.to_thread(filter_sheets, sheets, classifier, dest_lang if dest_langs is None else None)
+        metrics.record_cells(scanned, sum(len(texts) for _, _, _, texts in sheets))
+
+    async def translate_language(lang, output_file):
+        # A list of languages leaves the destination language check to each of them
+        lang_sheets = sheets if dest_langs is None else await asyncio.to_thread(filter_sheets, sheets, classifier, lang)
+        with phase(timings, "extract"):
+            previous = await loop.run_in_executor(None, previous_digests, output_file, src_lang, lang, previous_source)
+            if previous is None:
+                logging.info(f"No previous translation to diff against for {output_file}, translating every cell")
+                carried = {}
+            else:
+                carried = await loop.run_in_executor(None, carried_values, output_file, lang_sheets, previous)
+        changed = changed_cells(lang_sheets, carried)
+
+        texts = list(dict.fromkeys(text for _, _, _, sheet_texts in changed for text in sheet_texts))
+        logging.info(f"Incremental translation of {input_file} into {lang}: {len(texts)} changed strings, "
+                     f"{sum(len(values) for values in carried.values())} cells carried over")
+        # The manifest keeps the requested src_lang, so a resolved "auto" does not invalidate it
+        source_lang = resolve_source_language(texts, src_lang, lang, input_file)
+        with phase(timings, "translate"):
+            translations = dict(zip(texts, await deduplicator.translate(texts, source_lang, lang, cancellation_token, translator)))
+
+        with phase(timings, "save"):
+            await loop.run_in_executor(None, apply_incremental, input_file, output_file, lang_sheets, carried, translations)
+            await loop.run_in_executor(None, write_manifest, output_file, src_lang, lang, lang_sheets)
+        metrics.CELLS_TRANSLATED.inc(sum(len(texts) for _, _, _, texts in changed))
+
+    async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+        await asyncio.gather(*(translate_language(lang, output_file) for lang, output_file in outputs.items()))
+    progress_bar.progress(1.0)
+    return engine_result(outputs, dest_lang)
+
+WORKBOOK_ENGINES = {
+    "openpyxl": translate_workbook,
+    "streaming": translate_workbook_streaming,
+    "shared_strings": translate_workbook_shared_strings,
+}
+
+async def report_untranslated(failed, log_queue, where):
+    """Tells the user which strings the backend kept failing on; they were left in the source language."""
+    if not failed:
+        return
+    texts = list(dict.fromkeys(text for _, _, text in failed))
+    sample = ", ".join(repr(text[:40]) for text in texts[:5])
+    logging.warning(f"{len(texts)} strings of {where} could not be translated and keep their source text, e.g. {sample}")
+    await log_queue.put(f"{len(texts)} distinct texts could not be translated and were left as they were, e.g. {sample}")
+
+def select_engine(input_file, engine=None):
+    """Resolves an engine name (default TRANSLATION_ENGINE) to a key of WORKBOOK_ENGINES."""
+    engine = engine or TRANSLATION_ENGINE
+    if engine == "auto":
+        engine = "streaming" if source_size(input_file) >= STREAMING_THRESHOLD_BYTES else "openpyxl"
+    if engine not in WORKBOOK_ENGINES:
+        raise ValueError(f"Unknown workbook engine '{engine}', expected one of {sorted(WORKBOOK_ENGINES)} or 'auto'")
+    return engine
+
+async def translate_file(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=False, deduplicator=None, translation_memory=None, translator=None, scheduler=None, timings=None, engine=None, incremental=False, previous_source=None, output_dir=None, classifier=None):
+    """
+    Translates a single Excel file asynchronously.
+
+    `engine` names one of WORKBOOK_ENGINES; by default TRANSLATION_ENGINE decides.
+    With `incremental` (or a `previous_source` to diff against), only cells changed since the
+    last translation are translated; see translate_workbook_incremental.
+    The output goes next to the input, or into `output_dir` when given.
+
+    `dest_lang` may be a list of languages: the workbook is then parsed once, translated into
+    all of them concurrently under one scheduler, and {language: output path} is returned,
+    with outputs named translated_<language>_<name>.
+
+    `input_file` may also be bytes or a file-like object (e.g. a Streamlit upload): nothing is
+    written to disk then, and the output is a WorkbookBuffer (see utils.buffers) positioned at
+    its start, with the output name in its `filename`.
+    """
+    if deduplicator is None:
+        deduplicator = TranslationDeduplicator(translation_memory=translation_memory, scheduler=scheduler)
+    if is_buffer(input_file):
+        if incremental or previous_source is not None:
+            raise ValueError("Incremental translation diffs against the previous output on disk and needs a workbook path")
+        input_file = open_source(input_file)
+    options = {}
+    if incremental or previous_source is not None:
+        workbook_translator = translate_workbook_incremental
+        options["previous_source"] = previous_source
+    else:
+        workbook_translator = WORKBOOK_ENGINES[select_engine(input_file, engine)]
+    failed_before = len(deduplicator.failed)
+    with log_context(file=source_name(input_file)):
+        try:
+            async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+                translated_file_path = await workbook_translator(input_file, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=op_in_dir, deduplicator=deduplicator, translator=translator, timings=timings, output_dir=output_dir, classifier=classifier, **options)
+            if not op_in_dir:
+                # A folder job reports for all of its files at the end
+                await report_untranslated(deduplicator.failed[failed_before:], log_queue, source_name(input_file))
+            for output_file in (translated_file_path.values() if isinstance(translated_file_path, dict) else [translated_file_path]):
+                if is_buffer(output_file):
+                    output_file.seek(0)
+                await log_queue.put(f"File translated successfully: {source_name(output_file)}")
+                metrics.record_file(input_file, output_file)
+            if translation_memory is not None:
+                logging.info(f"Translation memory stats: {translation_memory.stats()}")
+            return translated_file_path
+        except CancellationException:
+            await log_queue.put("File translation cancelled.")
+        except Exception as e:
+            logging.error(f"Error translating file: {e}")
+            metrics.FILES_FAILED.inc()
+            raise RuntimeError(f"An error occurred while translating the file: {e}")
+
+def folder_inputs(folder_path):
+    """The workbooks of a folder to translate, leaving out the translated_* outputs of earlier runs."""
     excel_files = [file for file in Path(folder_path).rglob('*.xlsx')] + [file for file in Path(folder_path).rglob('*.xlsm')]
-    excel_files = list(set(excel_files))
+    return sorted(set(file for file in excel_files if not file.name.startswith("translated_")))
+
+async def translate_folder(folder_path, src_lang, dest_lang, cancellation_token, log_queue, progress_bar, translation_memory=None, translator=None, scheduler=None, timings=None, resume=True, output_dir=None, classifier=None, incremental=False):
+    """
+    Translates all Excel files within a specified folder asynchronously.
+
+    Files flow through a staged pipeline: workbooks are parsed and saved in a process pool,
+    translation stays on the event loop, and bounded queues between the stages hold at most
+    PIPELINE_DEPTH workbooks each, so a slow stage holds back the ones feeding it.
+
+    With `resume`, progress is checkpointed in a JobJournal, kept with the outputs: files already
+    translated with the same content and languages are skipped, and the sheets of an
+    interrupted file are served from the job's translation memory instead of being sent again.
+    Files written with strings the backend could not translate are translated again.
+
+    With `output_dir`, outputs are written there, mirroring the folder's subdirectories.
+    With `incremental`, each file goes through translate_file's incremental mode, so only the
+    cells changed since its existing output was made are translated.
+
+    Returns FolderResults: {input_file: output_file, or None when the file failed}, with the
+    files left partly untranslated in its `partial`. When `dest_lang` is a list, the folder is
+    translated once per language, into a translated_<language> subfolder of `output_dir` (or
+    of the folder), and {input_file: {language: output_file or None}} is returned.
+    """
+    dest_langs = fan_out(dest_lang)
+    if dest_langs is not None:
+        results = FolderResults()
+        for done, lang in enumerate(dest_langs):
+            lang_results = await translate_folder(folder_path, src_lang, lang, cancellation_token, log_queue,
+                                                  ProgressSlice(progress_bar, done / len(dest_langs), (done + 1) / len(dest_langs)),
+                                                  translation_memory=translation_memory, translator=translator, scheduler=scheduler, timings=timings,
+                                                  resume=resume, output_dir=os.path.join(output_dir or folder_path, f"translated_{lang}"), classifier=classifier,
+                                                  incremental=incremental)
+            for input_file, output_file in lang_results.items():
+                results.setdefault(input_file, {})[lang] = output_file
+            for input_file, untranslated in lang_results.partial.items():
+                results.partial.setdefault(input_file, {})[lang] = untranslated
+        return results
+
+    excel_files = folder_inputs(folder_path)
     
     logging.debug(f"files retrieved: {excel_files}")
-    tasks = []
-    file_paths = []
-    total_files = len(excel_files)
-    progress = 0
+    # Next to the outputs, so a read-only input folder can still be resumed
+    journal_dir = output_dir or folder_path
+    journal = JobJournal(folder_path, journal_dir) if resume else None
+    job_memory = None
+    if resume and translation_memory is None:
+        # Finished sheets must survive a crash even when the shared translation memory is off
+        job_memory = TranslationMemory(os.path.join(journal_dir, JOURNAL_MEMORY_NAME))
+    # One deduplicator for the whole folder, so strings shared between files are sent once
+    deduplicator = TranslationDeduplicator(translation_memory=translation_memory or job_memory, scheduler=scheduler)
+
+    loop = asyncio.get_running_loop()
+    pending = deque(str(file_path) for file_path in excel_files)
+    parsed = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+    translated = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+    results = FolderResults()
+    folder_progress = FolderProgress(progress_bar, len(excel_files))
+
+    def target_dir(input_file):
+        if output_dir is None:
+            return None
+        return os.path.normpath(os.path.join(output_dir, os.path.relpath(os.path.dirname(input_file), folder_path)))
+
+    def file_done(input_file, result, error=None, untranslated=0):
+        results[input_file] = result
+        if result and untranslated:
+            results.partial[input_file] = untranslated
+            logging.warning(f"{untranslated} strings of {input_file} were left untranslated; it is translated again on resume")
+        if journal is not None:
+            if result:
+                journal.finish(input_file, dest_lang, result, untranslated)
+            else:
+                journal.fail(input_file, dest_lang, error or "not translated")
+        folder_progress.file_done(input_file)
+        logging.info(f"Completed translation for workbook at: {input_file}")
+
+    async def parse_stage(pool):
+        while pending:
+            input_file = pending.popleft()
+            if journal is not None:
+                digest = await asyncio.to_thread(file_digest, input_file)
+                output_file = output_path_for(input_file, target_dir(input_file))
+                if journal.is_done(input_file, digest, src_lang, dest_lang, output_file):
+                    logging.info(f"Skipping unchanged, already translated workbook: {input_file}")
+                    file_done(input_file, output_file)
+                    continue
+                sheets_done = journal.start(input_file, digest, src_lang, dest_lang)
+                if sheets_done:
+                    logging.info(f"Resuming workbook {input_file}, sheets already translated: {sheets_done}")
+            logging.info(f"Started translation for workbook at: {input_file}")
+            if incremental or select_engine(input_file) != "openpyxl":
+                # The incremental mode and the streaming and shared strings engines do their own I/O
+                await parsed.put((input_file, None))
+                continue
+            try:
+                with phase(timings, "load"):
+                    sheets, scanned = await loop.run_in_executor(pool, extract_cells_counted, input_file)
+                sheets = await asyncio.to_thread(filter_sheets, sheets, classifier, dest_lang)
+                metrics.record_cells(scanned, sum(len(texts) for _, _, _, texts in sheets))
+            except Exception as e:
+                logging.error(f"Error reading {input_file}: {e}")
+                metrics.FILES_FAILED.inc()
+                file_done(input_file, None, e)
+                continue
+            await parsed.put((input_file, sheets))
+
+    async def translate_stage(translator):
+        while (item := await parsed.get()) is not None:
+            input_file, sheets = item
+            # Failures while this file is translated; other files translated alongside may add theirs,
+            # which only makes those files be retried too, from the memory
+            failed_before = len(deduplicator.failed)
+            if sheets is None:
+                try:
+                    result = await translate_file(input_file, src_lang, dest_lang, cancellation_token, log_queue, folder_progress.file_bar(input_file), op_in_dir=True, deduplicator=deduplicator, translator=translator, timings=timings, output_dir=target_dir(input_file), classifier=classifier,
+                                                  incremental=incremental)
+                except Exception as e:
+                    # translate_file has logged and counted it; the other files go on
+                    file_done(input_file, None, e)
+                    continue
+                file_done(input_file, result, untranslated=len(deduplicator.failed) - failed_before)
+                continue
+            translations = {}
+            try:
+                with phase(timings, "translate"), log_context(file=input_file):
+                    # Sheet by sheet, so the journal can checkpoint each one as it completes
+                    for title, _, _, sheet_texts in sheets:
+                        texts = list(dict.fromkeys(sheet_texts))
+                        sheet_src = resolve_source_language(texts, src_lang, dest_lang, f"sheet {title} of {input_file}")
+                        translations.update(zip(texts, await deduplicator.translate(texts, sheet_src, dest_lang, cancellation_token, translator)))
+                        if journal is not None:
+                            journal.sheet_done(input_file, dest_lang, title)
+            except CancellationException as e:
+                await log_queue.put("File translation cancelled.")
+                file_done(input_file, None, e)
+                continue
+            except Exception as e:
+                logging.error(f"Error translating file: {e}")
+                metrics.FILES_FAILED.inc()
+                file_done(input_file, None, e)
+                continue
+            await translated.put((input_file, sheets, translations, len(deduplicator.failed) - failed_before))
+
+    async def save_stage(pool):
+        while (item := await translated.get()) is not None:
+            input_file, sheets, translations, untranslated = item
+            try:
+                with phase(timings, "save"):
+                    output_file = await loop.run_in_executor(pool, apply_translations, input_file, output_path_for(input_file, target_dir(input_file)), sheets, translations)
+            except Exception as e:
+                logging.error(f"Error writing translation of {input_file}: {e}")
+                metrics.FILES_FAILED.inc()
+                file_done(input_file, None, e)
+                continue
+            metrics.CELLS_TRANSLATED.inc(sum(len(texts) for _, _, _, texts in sheets))
+            metrics.record_file(input_file, output_file)
+            await log_queue.put(f"File translated successfully: {output_file}")
+            file_done(input_file, output_file, untranslated=untranslated)
+
+    # Spawned rather than forked: this process already runs the log listener, job and server threads
+    pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    completed = False
+    try:
+        # One client pool for the whole folder, closed once every file is done or the job is cancelled
+        async with job_translator(translator, TRANSLATION_BACKEND, BACKEND_OPTIONS) as translator:
+            parsers = [asyncio.create_task(parse_stage(pool)) for _ in range(PROCESS_WORKERS)]
+            translators = [asyncio.create_task(translate_stage(translator)) for _ in range(MAX_CONCURRENT_FILES)]
+            savers = [asyncio.create_task(save_stage(pool)) for _ in range(PROCESS_WORKERS)]
+            try:
+                await asyncio.gather(*parsers)
+                for _ in translators:
+                    await parsed.put(None)
+                await asyncio.gather(*translators)
+                for _ in savers:
+                    await translated.put(None)
+                await asyncio.gather(*savers)
+            except BaseException:
+                for task in parsers + translators + savers:
+                    task.cancel()
+                raise
+        completed = True
+    finally:
+        pool.shutdown(wait=completed, cancel_futures=True)
+        if journal is not None:
+            journal.flush()
+        if job_memory is not None:
+            job_memory.close()
+
+    if job_memory is not None and not results.partial and all(results.get(str(file_path)) for file_path in excel_files):
+        # Nothing left to resume
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(job_memory.path + suffix):
+                os.remove(job_memory.path + suffix)
+
+    await report_untranslated(deduplicator.failed, log_queue, f"folder {folder_path}")
+    logging.info(f"Folder deduplication stats: {deduplicator.stats()}")
+    logging.info(f"Folder scheduler stats: {deduplicator.scheduler.stats()}")
+    if translation_memory is not None:
+        logging.info(f"Translation memory stats: {translation_memory.stats()}")
 
     for file_path in excel_files:
-        logging.info(f"Started translation for workbook at: {file_path}")
-        tasks.append(asyncio.create_task(translate_file(str(file_path), src_lang, dest_lang, cancellation_token, log_queue, progress_bar, op_in_dir=True)))
-        file_paths.append(file_path)
-        progress += 1
-        progress_bar.progress(progress / total_files)
-        logging.info(f"Completed translation for workbook at: {file_path}")
-    results = await asyncio.gather(*tasks)
-
-    for file_path, result in zip(file_paths, results):
+        result = results.get(str(file_path))
         if result:
-            await log_queue.put(f"Translated: {file_path} -> {result}")
\ No newline at end of file
+            untranslated = results.partial.get(str(file_path))
+            note = f" ({untranslated} strings left untranslated)" if untranslated else ""
+            await log_queue.put(f"Translated: {file_path} -> {result}{note}")
+    return results
@@ -0,0 +1,125 @@
+"""
+Incremental re-translation: diffing a new source revision against the one the previous
+translation was made from, so only edited cells are sent again.
+
+The previous revision is known either from the manifest written next to the translated
+output at the last incremental run, or from an explicit copy of the previous source.
+Cells are identified by (sheet, row, column) and compared by a digest of their text.
+"""
+import os
+import json
+import hashlib
+from openpyxl import load_workbook
+from utils.logging_mech import logger
+from utils.pipeline import extract_cells
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def manifest_path_for(output_file):
+    return f"{output_file}{MANIFEST_SUFFIX}"
+
+
+def cell_digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def source_digests(sheets):
+    """{sheet_title: {"row:col": digest}} for extract_cells' result."""
+    return {
+        title: {f"{row}:{col}": cell_digest(text) for row, col, text in zip(rows, cols, texts)}
+        for title, rows, cols, texts in sheets
+    }
+
+
+def write_manifest(output_file, src_lang, dest_lang, sheets):
+    path = manifest_path_for(output_file)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": 1, "src": src_lang, "dest": dest_lang, "sheets": source_digests(sheets)}, f)
+    os.replace(tmp_path, path)
+
+
+def previous_digests(output_file, src_lang, dest_lang, previous_source=None):
+    """
+    Digests of the source the existing translation at `output_file` was made from,
+    or None when there is nothing to diff against and a full translation is needed.
+    """
+    if not os.path.exists(output_file):
+        return None
+    if previous_source is not None:
+        return source_digests(extract_cells(previous_source))
+    path = manifest_path_for(output_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return None
+    if manifest.get("src") != src_lang or manifest.get("dest") != dest_lang:
+        return None
+    return manifest["sheets"]
+
+
+def carried_values(previous_output, sheets, previous):
+    """
+    Reads, from the previous translated output, the cells whose source text is unchanged since
+    `previous`: {sheet_title: {(row, col): value}}. Whatever is in the output is kept, post-edits
+    included; cells it no longer has are left out, so they are translated again.
+    """
+    wanted = {}
+    for title, rows, cols, texts in sheets:
+        old = previous.get(title, {})
+        wanted[title] = {
+            (row, col) for row, col, text in zip(rows, cols, texts)
+            if old.get(f"{row}:{col}") == cell_digest(text)
+        }
+
+    carried = {}
+    prior = load_workbook(previous_output, read_only=True)
+    try:
+        for title, positions in wanted.items():
+            if not positions or title not in prior.sheetnames:
+                continue
+            values = carried.setdefault(title, {})
+            ws = prior[title]
+            ws.reset_dimensions()
+            for row in ws.iter_rows():
+                for cell in row:
+                    if cell.value is not None and (cell.row, cell.column) in positions:
+                        values[(cell.row, cell.column)] = cell.value
+    finally:
+        prior.close()
+    return carried
+
+
+def changed_cells(sheets, carried):
+    """Returns extract_cells-shaped sheets holding only the cells that are not carried over."""
+    changed = []
+    for title, rows, cols, texts in sheets:
+        values = carried.get(title, {})
+        kept = [(row, col, text) for row, col, text in zip(rows, cols, texts) if (row, col) not in values]
+        changed.append((title, [r for r, _, _ in kept], [c for _, c, _ in kept], [t for _, _, t in kept]))
+    return changed
+
+
+def apply_incremental(input_file, output_file, sheets, carried, translations):
+    """
+    Writes the new revision's translation: carried cells keep their previous translation and the
+    rest get `translations`. Everything that is not translated (numbers, formulas, styles,
+    layout) comes from the new source.
+    """
+    wb = load_workbook(input_file, keep_vba=True)
+    for title, rows, cols, texts in sheets:
+        ws = wb[title]
+        values = carried.get(title, {})
+        for row, col, text in zip(rows, cols, texts):
+            value = values.get((row, col))
+            if value is None:
+                value = translations.get(text)
+            if value is not None:
+                ws.cell(row=row, column=col).value = value
+    wb.save(output_file)
+    return output_file
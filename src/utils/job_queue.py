@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from utils.logging_mech import logger
+from utils.jobs import QUEUED, RUNNING, DONE, FAILED, CANCELLED
+
+# The queue database and the uploaded workbooks; point every host at the same volume to share it
+QUEUE_DIR = os.environ.get("XSLM_QUEUE_DIR", os.path.join(os.path.expanduser("~"), ".xslm_translator", "jobs"))
+QUEUE_DB_NAME = "queue.sqlite3"
+# WAL needs shared memory, which network file systems lack; use "delete" for a volume shared between hosts
+QUEUE_JOURNAL_MODE = os.environ.get("XSLM_QUEUE_JOURNAL_MODE", "wal")
+# Jobs waiting beyond this are refused until workers catch up
+MAX_PENDING = int(os.environ.get("XSLM_QUEUE_MAX_PENDING", "100"))
+# A running job whose worker has been silent this long is handed to another worker...
+STALE_AFTER = float(os.environ.get("XSLM_QUEUE_STALE_AFTER", "60"))
+# ...at most this many times in all, then it fails
+MAX_ATTEMPTS = int(os.environ.get("XSLM_QUEUE_MAX_ATTEMPTS", "3"))
+# Finished jobs, and their uploads and outputs, are removed after this many hours
+RETENTION_HOURS = float(os.environ.get("XSLM_QUEUE_RETENTION_HOURS", "72"))
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_COLUMNS = ("id", "kind", "input", "upload", "src", "dest", "options", "status", "progress", "result", "error",
+            "logs", "metrics", "worker", "attempts", "cancel", "created", "started", "finished", "heartbeat")
+_JSON_COLUMNS = ("dest", "options", "result", "logs", "metrics")
+
+
+class QueueFull(Exception):
+    """Raised by `JobQueue.submit` when MAX_PENDING jobs are already waiting."""
+
+
+class LeaseLost(Exception):
+    """Raised by `JobQueue.heartbeat` when the job was handed to another worker or finished without this one."""
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite database, shared by the HTTP service and any number of worker
+    processes, on this host or on others mounting the same QUEUE_DIR.
+
+    Workers `claim` the oldest queued job inside an immediate transaction, so no two of them
+    take the same one, and `heartbeat` while they run it. Jobs of a worker that stopped
+    heartbeating are queued again; from then on the worker's heartbeats raise LeaseLost and
+    its status writes are ignored, so a job taken over by another worker is only finished
+    once. Rows are returned as dicts. Safe to share between threads.
+    """
+
+    def __init__(self, directory=QUEUE_DIR, max_pending=MAX_PENDING, journal_mode=QUEUE_JOURNAL_MODE):
+        self.directory = directory
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._last_housekeeping = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, QUEUE_DB_NAME), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, input TEXT NOT NULL, upload INTEGER NOT NULL DEFAULT 0, "
+            "src TEXT NOT NULL, dest TEXT NOT NULL, options TEXT NOT NULL, status TEXT NOT NULL, "
+            "progress REAL NOT NULL DEFAULT 0, result TEXT, error TEXT, logs TEXT, metrics TEXT, worker TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, cancel INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex[:12]
+
+    def job_dir(self, job_id):
+        """Where a job's upload and outputs are kept."""
+        return os.path.join(self.directory, job_id)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        for column in _JSON_COLUMNS:
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        job["upload"] = bool(job["upload"])
+        job["cancel"] = bool(job["cancel"])
+        return job
+
+    def _select(self, where="", params=()):
+        return self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs {where}", params).fetchall()
+
+    def submit(self, kind, input_path, src_lang, dest_lang, options=None, upload=False, job_id=None):
+        """
+        Queues a translate_file ("file") or translate_folder ("folder") job and returns its ID.
+
+        Raises QueueFull when `max_pending` jobs are already queued.
+        """
+        job_id = job_id or self.new_id()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (pending,) = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+                if pending >= self.max_pending:
+                    raise QueueFull(f"{pending} jobs are already queued")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, input, upload, src, dest, options, status, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, input_path, int(upload), src_lang, json.dumps(dest_lang), json.dumps(options or {}), QUEUED, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Queued {kind} job {job_id}: {input_path}")
+        return job_id
+
+    def claim(self, worker):
+        """Marks the oldest queued job as running on `worker` and returns it, or None when nothing is queued."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._select("WHERE status = ? AND cancel = 0 ORDER BY created LIMIT 1", (QUEUED,))
+                if rows:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started = ?, heartbeat = ? WHERE id = ?",
+                        (RUNNING, worker, now, now, rows[0][0]),
+                    )
+                    rows = self._select("WHERE id = ?", (rows[0][0],))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row(rows[0]) if rows else None
+
+    def heartbeat(self, job_id, worker, progress):
+        """
+        Records that `worker` is still running the job and how far it got; returns True once it should be cancelled.
+
+        Raises LeaseLost when the job is no longer running on `worker`.
+        """
+        with self._lock:
+            owned = self._conn.execute(
+                "UPDATE jobs SET heartbeat = ?, progress = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), progress, job_id, worker, RUNNING),
+            ).rowcount
+            row = self._conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not owned:
+            raise LeaseLost(f"Job {job_id} is no longer running on {worker}")
+        return bool(row and row[0])
+
+    def finish(self, job_id, worker, status, result=None, error=None, logs=None, metrics=None):
+        """Records the outcome of a job run by `worker`; returns False, changing nothing, when the worker lost it."""
+        progress = ", progress = 1" if status == DONE else ""
+        with self._lock:
+            owned = self._conn.execute(
+                f"UPDATE jobs SET status = ?, result = ?, error = ?, logs = ?, metrics = ?, finished = ?{progress} "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (status, json.dumps(result), error, json.dumps(logs or []), json.dumps(metrics), time.time(), job_id, worker, RUNNING),
+            ).rowcount
+        return bool(owned)
+
+    def release(self, job_id, worker):
+        """
+        Puts a job `worker` gave up on (e.g. when shutting down) back in the queue, without using an attempt,
+        or cancels it when its cancellation was requested; returns False when the worker had already lost it.
+        """
+        with self._lock:
+            owned = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel THEN ? ELSE ? END, finished = CASE WHEN cancel THEN ? END, "
+                "worker = NULL, progress = 0, attempts = attempts - 1 WHERE id = ? AND worker = ? AND status = ?",
+                (CANCELLED, QUEUED, time.time(), job_id, worker, RUNNING),
+            ).rowcount
+        return bool(owned)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job at once; a running job is flagged and stopped by its worker at the next heartbeat.
+
+        Returns the job, or None when there is no such job.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?", (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            self._conn.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+        job = self.get(job_id)
+        if job is not None:
+            logger.info(f"Cancellation requested for job {job_id}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            rows = self._select("WHERE id = ?", (job_id,))
+        return self._row(rows[0]) if rows else None
+
+    def jobs(self, limit=50):
+        """The most recently submitted jobs, newest first."""
+        with self._lock:
+            rows = self._select("ORDER BY created DESC LIMIT ?", (limit,))
+        return [self._row(row) for row in rows]
+
+    def depth(self):
+        """{status: number of jobs} for every status."""
+        counts = dict.fromkeys((QUEUED, RUNNING) + FINISHED, 0)
+        with self._lock:
+            counts.update(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def oldest_queued_age(self):
+        """Seconds the oldest queued job has been waiting, 0 when none is."""
+        with self._lock:
+            (created,) = self._conn.execute("SELECT MIN(created) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+        return time.time() - created if created is not None else 0.0
+
+    def requeue_stale(self, stale_after=STALE_AFTER, max_attempts=MAX_ATTEMPTS):
+        """
+        Queues again the running jobs whose worker stopped heartbeating, cancels those whose cancellation
+        was requested and fails those out of attempts.
+        """
+        cutoff = time.time() - stale_after
+        with self._lock:
+            cancelled = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ? WHERE status = ? AND heartbeat < ? AND cancel = 1",
+                (CANCELLED, time.time(), RUNNING, cutoff),
+            ).rowcount
+            failed = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (FAILED, "Worker stopped responding", time.time(), RUNNING, cutoff, max_attempts),
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, progress = 0 WHERE status = ? AND heartbeat < ?", (QUEUED, RUNNING, cutoff)
+            ).rowcount
+        if cancelled or failed or requeued:
+            logger.warning(f"Jobs of unresponsive workers: {requeued} queued again, {cancelled} cancelled, {failed} failed")
+        return requeued
+
+    def purge(self, retention_hours=RETENTION_HOURS):
+        """Removes finished jobs older than `retention_hours`, with their upload directories."""
+        cutoff = time.time() - retention_hours * 3600
+        marks = ", ".join("?" * len(FINISHED))
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                f"SELECT id FROM jobs WHERE status IN ({marks}) AND finished < ?", (*FINISHED, cutoff)
+            ).fetchall()]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return len(expired)
+
+    def housekeeping(self, interval=30):
+        """requeue_stale and purge, at most once per `interval` seconds; cheap enough to call from a polling loop."""
+        now = time.monotonic()
+        if now - self._last_housekeeping < interval:
+            return
+        self._last_housekeeping = now
+        self.requeue_stale()
+        self.purge()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
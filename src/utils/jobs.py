@@ -0,0 +1,190 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from utils.logging_mech import logger, log_context
+from utils.row_ds import CancellationToken
+from utils.backends import create_backend
+from utils.scheduler import RequestScheduler
+from utils.handler import translate_file, translate_folder, TRANSLATION_BACKEND, BACKEND_OPTIONS
+from utils.buffers import source_name
+from utils import metrics
+
+# Jobs running at once across all sessions; the others wait in "queued"
+MAX_CONCURRENT_JOBS = int(os.environ.get("XSLM_MAX_CONCURRENT_JOBS", "2"))
+# Finished jobs kept for their results and logs, oldest dropped first
+JOB_HISTORY = int(os.environ.get("XSLM_JOB_HISTORY", "50"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobLog:
+    """Collects a job's log messages; stands in for the asyncio.Queue the handlers put messages on."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def put(self, message):
+        self.messages.append(message)
+
+
+class Job:
+    """
+    A translation job run by the JobManager.
+
+    The job doubles as the progress bar handed to the handler, so `progress` always holds
+    the last reported fraction. Fields are written by the manager's event loop thread and
+    only read elsewhere.
+    """
+
+    def __init__(self, kind, description):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.description = description
+        self.status = QUEUED
+        self.progress_value = 0.0
+        self.log = JobLog()
+        self.cancellation_token = CancellationToken()
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.metrics_baseline = None
+        self.metrics = None
+
+    def progress(self, value):
+        self.progress_value = min(value, 1.0)
+
+    @property
+    def logs(self):
+        return list(self.log.messages)
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def job_metrics(self):
+        """The metrics registry's activity since the job started (shared with any concurrent job)."""
+        if self.metrics is not None:
+            return self.metrics
+        if self.metrics_baseline is None:
+            return None
+        return metrics.delta(self.metrics_baseline, metrics.REGISTRY.snapshot())
+
+
+class JobManager:
+    """
+    Runs translation jobs on a dedicated event loop thread, so callers never block on them.
+
+    All jobs share one translation backend (and so one client pool) and one RequestScheduler,
+    so concurrent jobs from several users stay within the same rate limit. Jobs are looked up
+    by ID and kept after they finish, up to JOB_HISTORY of them.
+    """
+
+    def __init__(self, max_concurrent_jobs=MAX_CONCURRENT_JOBS, backend=TRANSLATION_BACKEND, backend_options=None, scheduler=None):
+        self.backend = backend
+        self.backend_options = BACKEND_OPTIONS if backend_options is None else backend_options
+        self.translator = None
+        self.scheduler = scheduler
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="xslm-jobs", daemon=True)
+        self._thread.start()
+        self._slots = None
+        self._max_concurrent_jobs = max_concurrent_jobs
+
+    def submit_file(self, input_file, src_lang, dest_lang, **options):
+        """
+        Queues translate_file for `input_file`, a path or an in-memory workbook such as a Streamlit
+        upload; returns the job ID. `options` are passed to translate_file.
+        """
+        return self._submit("file", os.path.basename(source_name(input_file)), translate_file, input_file, src_lang, dest_lang, options)
+
+    def submit_folder(self, folder_path, src_lang, dest_lang, **options):
+        """Queues translate_folder for `folder_path`; returns the job ID. `options` are passed to translate_folder."""
+        return self._submit("folder", folder_path, translate_folder, folder_path, src_lang, dest_lang, options)
+
+    def _submit(self, kind, description, handler, path, src_lang, dest_lang, options):
+        job = Job(kind, description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        asyncio.run_coroutine_threadsafe(self._run(job, handler, path, src_lang, dest_lang, options), self.loop)
+        logger.info(f"Queued {kind} job {job.id}: {description}")
+        return job.id
+
+    async def _shared(self):
+        # Created on the manager's loop, which every job runs on
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_concurrent_jobs)
+        if self.scheduler is None:
+            self.scheduler = RequestScheduler()
+        if self.translator is None:
+            self.translator = create_backend(self.backend, **self.backend_options)
+        return self._slots
+
+    async def _run(self, job, handler, path, src_lang, dest_lang, options):
+        slots = await self._shared()
+        with log_context(job=job.id):
+            await self._run_job(slots, job, handler, path, src_lang, dest_lang, options)
+
+    async def _run_job(self, slots, job, handler, path, src_lang, dest_lang, options):
+        async with slots:
+            if job.cancellation_token.is_cancelled():
+                job.status = CANCELLED
+                job.finished = time.time()
+                return
+            job.status = RUNNING
+            job.started = time.time()
+            job.metrics_baseline = metrics.REGISTRY.snapshot()
+            try:
+                job.result = await handler(path, src_lang, dest_lang, job.cancellation_token, job.log, job,
+                                           translator=self.translator, scheduler=self.scheduler, **options)
+                if job.cancellation_token.is_cancelled():
+                    job.status = CANCELLED
+                else:
+                    job.status = DONE
+                    job.progress(1.0)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished = time.time()
+                job.metrics = metrics.delta(job.metrics_baseline, metrics.REGISTRY.snapshot())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Asks a job to stop; batches already sent finish, nothing new is sent."""
+        job = self.get(job_id)
+        if job is not None and job.active:
+            job.cancellation_token.cancel()
+            logger.info(f"Cancellation requested for job {job_id}")
+        return job
+
+    def shutdown(self, timeout=30):
+        """Closes the shared backend and stops the loop thread. Running jobs are abandoned."""
+        async def close():
+            if self.translator is not None:
+                await self.translator.aclose()
+        try:
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import hashlib
+from utils.logging_mech import logger
+
+JOURNAL_NAME = ".xslm_journal.json"
+JOURNAL_VERSION = 2
+# Translations of a folder job are kept next to the journal so a resumed job re-sends nothing
+JOURNAL_MEMORY_NAME = ".xslm_journal_tm.sqlite3"
+
+_FLUSH_INTERVAL = 1.0
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JobJournal:
+    """
+    Checkpoint journal of a folder job, stored as JSON in `directory`: the folder itself, or
+    the output directory when the outputs go elsewhere, so the input may be read-only.
+
+    Each input file has an entry per destination language, with the content hash and
+    source language it was translated with, the sheets already translated and, once done,
+    the output path. A file whose entry for the language is done for the same hash and
+    source language, and whose output still exists, does not need translating again. A file
+    written with some strings left untranslated is "partial" and is translated again.
+    """
+
+    def __init__(self, folder_path, directory=None):
+        self.folder_path = folder_path
+        directory = directory or folder_path
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, JOURNAL_NAME)
+        self.entries = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    journal = json.load(f)
+                # Version 1 journals had one entry per file, whatever the language; start over
+                if journal.get("version") == JOURNAL_VERSION:
+                    self.entries = journal.get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable job journal {self.path}: {e}")
+
+    def _key(self, input_file):
+        return os.path.relpath(input_file, self.folder_path)
+
+    def entry(self, input_file, dest_lang):
+        return self.entries.get(self._key(input_file), {}).get(dest_lang)
+
+    def is_done(self, input_file, digest, src_lang, dest_lang, output_file=None):
+        """True when the file was translated from this content and languages (to `output_file`, when given)."""
+        entry = self.entry(input_file, dest_lang)
+        return (
+            entry is not None
+            and entry["status"] == "done"
+            and entry["hash"] == digest
+            and entry["src"] == src_lang
+            and entry["dest"] == dest_lang
+            and (output_file is None or entry["output"] == os.path.relpath(output_file, self.folder_path))
+            and os.path.exists(os.path.join(self.folder_path, entry["output"]))
+        )
+
+    def start(self, input_file, digest, src_lang, dest_lang):
+        """Opens (or resumes) the entry of a file; returns the sheets already done for this content."""
+        entries = self.entries.setdefault(self._key(input_file), {})
+        entry = entries.get(dest_lang)
+        if entry is None or entry["hash"] != digest or entry["src"] != src_lang:
+            entry = {"hash": digest, "src": src_lang, "dest": dest_lang, "sheets_done": []}
+            entries[dest_lang] = entry
+        entry.update(status="in_progress", output=None, error=None, updated=time.time())
+        self._touch(force=True)
+        return list(entry["sheets_done"])
+
+    def sheet_done(self, input_file, dest_lang, sheet):
+        entry = self.entry(input_file, dest_lang)
+        if entry is not None and sheet not in entry["sheets_done"]:
+            entry["sheets_done"].append(sheet)
+            entry["updated"] = time.time()
+            self._touch()
+
+    def finish(self, input_file, dest_lang, output_file, untranslated=0):
+        """Records the file's output; with `untranslated` strings left in the source language, it is only partial."""
+        entry = self.entry(input_file, dest_lang)
+        if entry is not None:
+            entry.update(status="partial" if untranslated else "done", untranslated=untranslated,
+                         output=os.path.relpath(output_file, self.folder_path), updated=time.time())
+            self._touch(force=True)
+
+    def fail(self, input_file, dest_lang, error):
+        entry = self.entry(input_file, dest_lang)
+        if entry is not None:
+            entry.update(status="failed", error=str(error), updated=time.time())
+            self._touch(force=True)
+
+    def _touch(self, force=False):
+        self._dirty = True
+        if force or time.monotonic() - self._last_flush >= _FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self._dirty:
+            return
+        # Write-then-rename, so a crash mid-write never leaves a truncated journal behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": JOURNAL_VERSION, "files": self.entries}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._last_flush = time.monotonic()
@@ -0,0 +1,126 @@
+"""
+Offline language identification of cell text.
+
+Latin-script languages are told apart by a naive Bayes model over character 1-3 grams,
+trained at first use from utils.langid_corpus. Languages with their own script (Russian,
+Japanese, Chinese, Korean) are recognised from the script alone. Cells are short, so a
+language is only reported when the text is long enough and the best guess clearly beats
+the runner-up per n-gram, so a few lucky n-grams in a short cell are not enough; anything
+else is "unknown" and is translated as usual.
+"""
+import os
+import math
+import threading
+from functools import lru_cache
+from collections import Counter
+from utils.langid_corpus import CORPUS
+
+# A confident guess needs this many letters...
+MIN_LETTERS = int(os.environ.get("XSLM_LANGID_MIN_LETTERS", "4"))
+# ...and a log-likelihood lead over the runner-up of at least this much per n-gram of the text
+# (calibrated on short business phrases: lower lets random letters pass as a language)
+MIN_MARGIN = float(os.environ.get("XSLM_LANGID_MIN_MARGIN", "0.3"))
+
+# Guesses remembered per identifier, so checking a text against several languages detects it once
+CACHE_SIZE = int(os.environ.get("XSLM_LANGID_CACHE_SIZE", "65536"))
+# dominant_language looks at no more than this many distinct texts
+SAMPLE_SIZE = int(os.environ.get("XSLM_LANGID_SAMPLE", "500"))
+
+_NGRAM_SIZES = (1, 2, 3)
+
+
+def _ngrams(text):
+    padded = f" {' '.join(''.join(ch if ch.isalpha() else ' ' for ch in text.lower()).split())} "
+    for size in _NGRAM_SIZES:
+        for start in range(len(padded) - size + 1):
+            gram = padded[start:start + size]
+            if gram != " " * size:
+                yield gram
+
+
+def _script(ch):
+    code = ord(ch)
+    if 0x3040 <= code <= 0x30FF:
+        return "kana"
+    if 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF:
+        return "han"
+    if 0xAC00 <= code <= 0xD7AF or 0x1100 <= code <= 0x11FF:
+        return "hangul"
+    if 0x0400 <= code <= 0x04FF:
+        return "cyrillic"
+    if code < 0x0250:
+        return "latin"
+    return "other"
+
+
+class LanguageIdentifier:
+    """Guesses the language of short texts; see `detect`."""
+
+    def __init__(self, corpus=None, min_letters=MIN_LETTERS, min_margin=MIN_MARGIN):
+        self.corpus = CORPUS if corpus is None else corpus
+        self.min_letters = min_letters
+        self.min_margin = min_margin
+        self._model = None
+        self._lock = threading.Lock()
+        self.detect = lru_cache(maxsize=CACHE_SIZE)(self.detect)
+
+    def _train(self):
+        with self._lock:
+            if self._model is None:
+                counts = {lang: Counter(_ngrams(text)) for lang, text in self.corpus.items()}
+                vocabulary = set().union(*counts.values())
+                totals = {lang: sum(grams.values()) + len(vocabulary) for lang, grams in counts.items()}
+                # {n-gram: its log-probability in every language}, so scoring a text is one lookup per n-gram
+                table = {gram: tuple(math.log((counts[lang][gram] + 1) / totals[lang]) for lang in counts) for gram in vocabulary}
+                unseen = tuple(math.log(1 / totals[lang]) for lang in counts)
+                self._model = (tuple(counts), table, unseen)
+        return self._model
+
+    def detect(self, text):
+        """The language code of `text` ("en", "de", "zh-CN", ...), or None when unsure."""
+        scripts = Counter(_script(ch) for ch in text if ch.isalpha())
+        letters = sum(scripts.values())
+        if letters < self.min_letters:
+            return None
+        script, count = scripts.most_common(1)[0]
+        if count < 0.8 * letters:
+            return None
+        if script == "cyrillic":
+            return "ru"
+        if script == "hangul":
+            return "ko"
+        if script in ("kana", "han"):
+            # Japanese mixes kana into Han; Chinese has none
+            return "ja" if scripts["kana"] else "zh-CN"
+        if script != "latin":
+            return None
+
+        langs, table, unseen = self._train()
+        grams = [table.get(gram, unseen) for gram in _ngrams(text)]
+        scores = sorted(zip(map(sum, zip(*grams)), langs), reverse=True)
+        (best, lang), (runner_up, _) = scores[0], scores[1]
+        if best - runner_up < self.min_margin * len(grams):
+            return None
+        return lang
+
+    def is_language(self, text, lang):
+        """True only when `text` is confidently in `lang` (compared case-insensitively, so "zh-cn" works too)."""
+        detected = self.detect(text)
+        return detected is not None and detected.lower() == lang.lower()
+
+    def dominant_language(self, texts, min_share=0.6, sample=SAMPLE_SIZE):
+        """
+        The language of most of `texts`, or None without a clear majority.
+
+        Each distinct text votes once, and only the first `sample` of them are looked at.
+        """
+        distinct = list(dict.fromkeys(texts))[:sample]
+        votes = Counter(lang for lang in map(self.detect, distinct) if lang is not None)
+        if not votes:
+            return None
+        lang, count = votes.most_common(1)[0]
+        return lang if count >= min_share * sum(votes.values()) else None
+
+
+# Shared by the classifier and the handlers; the model is trained on first use
+IDENTIFIER = LanguageIdentifier()
@@ -0,0 +1,129 @@
+"""
+Training text for utils.langid's character n-gram profiles.
+
+Kept as a module rather than data files so it is bundled wherever the code is, frozen
+builds included. The text mixes everyday prose with the vocabulary found in business
+spreadsheets: headers, units, statuses and short instructions.
+"""
+
+CORPUS = {
+    "en": """
+The quarterly report shows that total sales increased by twelve percent compared with the previous year.
+Please enter the customer name, the order number and the delivery date in the table below.
+All prices include value added tax unless otherwise stated. Shipping costs are calculated at checkout.
+The project team will review the open issues on Monday and assign an owner to each of them.
+Description, quantity, unit price, amount, discount, subtotal, total, status, comments, approved by.
+Our warehouse is closed on public holidays, and orders placed during the weekend are processed on the next working day.
+If you have any questions about this invoice, please contact the accounting department.
+The machine must be switched off before cleaning, and the safety guard has to stay in place while it is running.
+Employees who work overtime should record their hours in the timesheet at the end of each week.
+This document describes the requirements for the new system and the steps needed to migrate the existing data.
+Revenue, expenses, profit and loss, balance sheet, cash flow, forecast, budget, actual, variance.
+Please check whether the figures are correct and send your feedback to the finance team by Friday.
+The supplier confirmed that the missing parts will arrive next week together with the replacement order.
+Name of the contact person, phone number, email address, country, city, street and postal code.
+We would like to thank you for your order and hope that you are satisfied with our products and services.
+""",
+    "de": """
+Der Quartalsbericht zeigt, dass der Gesamtumsatz im Vergleich zum Vorjahr um zwölf Prozent gestiegen ist.
+Bitte tragen Sie den Namen des Kunden, die Bestellnummer und das Lieferdatum in die folgende Tabelle ein.
+Alle Preise verstehen sich inklusive Mehrwertsteuer, sofern nicht anders angegeben. Die Versandkosten werden an der Kasse berechnet.
+Das Projektteam wird die offenen Punkte am Montag prüfen und jedem von ihnen einen Verantwortlichen zuweisen.
+Beschreibung, Menge, Einzelpreis, Betrag, Rabatt, Zwischensumme, Gesamtsumme, Status, Bemerkungen, genehmigt von.
+Unser Lager ist an Feiertagen geschlossen, und Bestellungen vom Wochenende werden am nächsten Werktag bearbeitet.
+Wenn Sie Fragen zu dieser Rechnung haben, wenden Sie sich bitte an die Buchhaltung.
+Die Maschine muss vor der Reinigung ausgeschaltet werden, und die Schutzabdeckung muss während des Betriebs angebracht bleiben.
+Mitarbeiter, die Überstunden leisten, sollten ihre Stunden am Ende jeder Woche im Stundenzettel erfassen.
+Dieses Dokument beschreibt die Anforderungen an das neue System und die Schritte, die für die Übernahme der vorhandenen Daten nötig sind.
+Umsatz, Aufwendungen, Gewinn und Verlust, Bilanz, Kapitalfluss, Prognose, Budget, Ist-Wert, Abweichung.
+Bitte prüfen Sie, ob die Zahlen korrekt sind, und senden Sie Ihre Rückmeldung bis Freitag an die Finanzabteilung.
+Der Lieferant hat bestätigt, dass die fehlenden Teile nächste Woche zusammen mit der Ersatzbestellung eintreffen.
+Name der Kontaktperson, Telefonnummer, E-Mail-Adresse, Land, Stadt, Straße und Postleitzahl.
+Wir bedanken uns für Ihre Bestellung und hoffen, dass Sie mit unseren Produkten und Dienstleistungen zufrieden sind.
+""",
+    "fr": """
+Le rapport trimestriel montre que le chiffre d'affaires total a augmenté de douze pour cent par rapport à l'année précédente.
+Veuillez saisir le nom du client, le numéro de commande et la date de livraison dans le tableau ci-dessous.
+Tous les prix comprennent la taxe sur la valeur ajoutée, sauf indication contraire. Les frais de port sont calculés lors du paiement.
+L'équipe de projet examinera les points ouverts lundi et attribuera un responsable à chacun d'entre eux.
+Description, quantité, prix unitaire, montant, remise, sous-total, total, statut, commentaires, approuvé par.
+Notre entrepôt est fermé les jours fériés, et les commandes passées pendant le week-end sont traitées le jour ouvrable suivant.
+Si vous avez des questions concernant cette facture, veuillez contacter le service de comptabilité.
+La machine doit être éteinte avant le nettoyage, et le carter de protection doit rester en place pendant son fonctionnement.
+Les employés qui font des heures supplémentaires doivent les enregistrer dans la feuille de temps à la fin de chaque semaine.
+Ce document décrit les exigences du nouveau système et les étapes nécessaires à la migration des données existantes.
+Chiffre d'affaires, charges, pertes et profits, bilan, flux de trésorerie, prévision, budget, réel, écart.
+Veuillez vérifier que les chiffres sont corrects et envoyer vos remarques à l'équipe financière avant vendredi.
+Le fournisseur a confirmé que les pièces manquantes arriveront la semaine prochaine avec la commande de remplacement.
+Nom de la personne à contacter, numéro de téléphone, adresse électronique, pays, ville, rue et code postal.
+Nous vous remercions de votre commande et espérons que vous êtes satisfait de nos produits et de nos services.
+""",
+    "es": """
+El informe trimestral muestra que las ventas totales aumentaron un doce por ciento en comparación con el año anterior.
+Por favor, introduzca el nombre del cliente, el número de pedido y la fecha de entrega en la tabla siguiente.
+Todos los precios incluyen el impuesto sobre el valor añadido, salvo que se indique lo contrario. Los gastos de envío se calculan al pagar.
+El equipo del proyecto revisará los puntos pendientes el lunes y asignará un responsable a cada uno de ellos.
+Descripción, cantidad, precio unitario, importe, descuento, subtotal, total, estado, comentarios, aprobado por.
+Nuestro almacén está cerrado los días festivos, y los pedidos realizados durante el fin de semana se procesan el siguiente día hábil.
+Si tiene alguna pregunta sobre esta factura, póngase en contacto con el departamento de contabilidad.
+La máquina debe apagarse antes de la limpieza, y la protección de seguridad debe permanecer colocada mientras está en marcha.
+Los empleados que hacen horas extra deben registrar sus horas en la hoja de horas al final de cada semana.
+Este documento describe los requisitos del nuevo sistema y los pasos necesarios para migrar los datos existentes.
+Ingresos, gastos, pérdidas y ganancias, balance, flujo de caja, previsión, presupuesto, real, desviación.
+Por favor, compruebe si las cifras son correctas y envíe sus comentarios al equipo de finanzas antes del viernes.
+El proveedor confirmó que las piezas que faltan llegarán la próxima semana junto con el pedido de sustitución.
+Nombre de la persona de contacto, número de teléfono, dirección de correo electrónico, país, ciudad, calle y código postal.
+Le agradecemos su pedido y esperamos que esté satisfecho con nuestros productos y servicios.
+""",
+    "it": """
+Il rapporto trimestrale mostra che le vendite totali sono aumentate del dodici per cento rispetto all'anno precedente.
+Si prega di inserire il nome del cliente, il numero d'ordine e la data di consegna nella tabella sottostante.
+Tutti i prezzi includono l'imposta sul valore aggiunto, salvo diversa indicazione. Le spese di spedizione vengono calcolate al momento del pagamento.
+Il gruppo di progetto esaminerà i punti aperti lunedì e assegnerà un responsabile a ciascuno di essi.
+Descrizione, quantità, prezzo unitario, importo, sconto, subtotale, totale, stato, commenti, approvato da.
+Il nostro magazzino è chiuso nei giorni festivi, e gli ordini effettuati durante il fine settimana vengono elaborati il giorno lavorativo successivo.
+Per qualsiasi domanda su questa fattura, si prega di contattare l'ufficio contabilità.
+La macchina deve essere spenta prima della pulizia, e la protezione di sicurezza deve rimanere al suo posto durante il funzionamento.
+I dipendenti che fanno gli straordinari devono registrare le loro ore nel foglio presenze alla fine di ogni settimana.
+Questo documento descrive i requisiti del nuovo sistema e i passaggi necessari per migrare i dati esistenti.
+Ricavi, costi, profitti e perdite, stato patrimoniale, flusso di cassa, previsione, budget, consuntivo, scostamento.
+Si prega di verificare che i dati siano corretti e di inviare il vostro riscontro al gruppo finanza entro venerdì.
+Il fornitore ha confermato che i pezzi mancanti arriveranno la prossima settimana insieme all'ordine sostitutivo.
+Nome della persona di contatto, numero di telefono, indirizzo di posta elettronica, paese, città, via e codice postale.
+Vi ringraziamo per il vostro ordine e speriamo che siate soddisfatti dei nostri prodotti e servizi.
+""",
+    "pt": """
+O relatório trimestral mostra que as vendas totais aumentaram doze por cento em comparação com o ano anterior.
+Por favor, introduza o nome do cliente, o número da encomenda e a data de entrega na tabela abaixo.
+Todos os preços incluem o imposto sobre o valor acrescentado, salvo indicação em contrário. Os custos de envio são calculados no pagamento.
+A equipa do projeto vai analisar as questões pendentes na segunda-feira e atribuir um responsável a cada uma delas.
+Descrição, quantidade, preço unitário, valor, desconto, subtotal, total, situação, comentários, aprovado por.
+O nosso armazém está fechado nos feriados, e as encomendas feitas durante o fim de semana são processadas no dia útil seguinte.
+Se tiver alguma dúvida sobre esta fatura, entre em contacto com o departamento de contabilidade.
+A máquina deve ser desligada antes da limpeza, e a proteção de segurança tem de permanecer no lugar enquanto estiver a funcionar.
+Os funcionários que fazem horas extraordinárias devem registar as suas horas na folha de horas no final de cada semana.
+Este documento descreve os requisitos do novo sistema e os passos necessários para migrar os dados existentes.
+Receitas, despesas, lucros e perdas, balanço, fluxo de caixa, previsão, orçamento, real, desvio.
+Por favor, verifique se os números estão corretos e envie a sua opinião à equipa financeira até sexta-feira.
+O fornecedor confirmou que as peças em falta vão chegar na próxima semana juntamente com a encomenda de substituição.
+Nome da pessoa de contacto, número de telefone, endereço de correio eletrónico, país, cidade, rua e código postal.
+Agradecemos a sua encomenda e esperamos que fique satisfeito com os nossos produtos e serviços.
+""",
+    "nl": """
+Het kwartaalverslag laat zien dat de totale omzet met twaalf procent is gestegen ten opzichte van vorig jaar.
+Vul de naam van de klant, het bestelnummer en de leverdatum in de onderstaande tabel in.
+Alle prijzen zijn inclusief btw, tenzij anders vermeld. De verzendkosten worden bij het afrekenen berekend.
+Het projectteam bekijkt de openstaande punten op maandag en wijst aan elk punt een verantwoordelijke toe.
+Omschrijving, aantal, stukprijs, bedrag, korting, subtotaal, totaal, status, opmerkingen, goedgekeurd door.
+Ons magazijn is op feestdagen gesloten, en bestellingen die in het weekend worden geplaatst, worden de volgende werkdag verwerkt.
+Als u vragen heeft over deze factuur, neem dan contact op met de boekhouding.
+De machine moet voor het schoonmaken worden uitgeschakeld, en de beschermkap moet tijdens het draaien op zijn plaats blijven.
+Medewerkers die overuren maken, moeten hun uren aan het einde van elke week in de urenstaat invullen.
+Dit document beschrijft de eisen voor het nieuwe systeem en de stappen die nodig zijn om de bestaande gegevens over te zetten.
+Opbrengsten, kosten, winst en verlies, balans, kasstroom, prognose, begroting, werkelijk, afwijking.
+Controleer of de cijfers kloppen en stuur uw feedback voor vrijdag naar het financiële team.
+De leverancier heeft bevestigd dat de ontbrekende onderdelen volgende week samen met de vervangende bestelling aankomen.
+Naam van de contactpersoon, telefoonnummer, e-mailadres, land, stad, straat en postcode.
+Wij danken u voor uw bestelling en hopen dat u tevreden bent met onze producten en diensten.
+""",
+}
@@ -1,12 +1,210 @@
+"""
+The shared `logger`, kept off the translation hot path.
+
+Records are put on an in-memory queue by a QueueHandler and formatted and written by a
+QueueListener thread, so a slow console or disk never blocks the event loop, and tracebacks
+are rendered on the listener thread too. Every record carries the job, file and sheet IDs
+set with `log_context`. Warnings and errors repeated from the same line are rate limited,
+so an error storm costs a dictionary lookup per record instead of a write.
+
+Configured from the environment:
+  XSLM_LOG_LEVEL          DEBUG, INFO, WARNING or ERROR (default DEBUG)
+  XSLM_LOG_FORMAT         text (default) or json, one object per line
+  XSLM_LOG_MAX_MB         size at which log files are rotated (default 10)
+  XSLM_LOG_BACKUPS        rotated files kept (default 5)
+  XSLM_LOG_REPEAT_LIMIT   records per line and level let through per window (default 20)
+  XSLM_LOG_REPEAT_WINDOW  length of that window in seconds (default 60)
+"""
+import os
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+import contextvars
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_LEVEL = os.environ.get("XSLM_LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.environ.get("XSLM_LOG_FORMAT", "text").lower()
+LOG_MAX_BYTES = int(float(os.environ.get("XSLM_LOG_MAX_MB", "10")) * 1024 * 1024)
+LOG_BACKUPS = int(os.environ.get("XSLM_LOG_BACKUPS", "5"))
+REPEAT_LIMIT = int(os.environ.get("XSLM_LOG_REPEAT_LIMIT", "20"))
+REPEAT_WINDOW = float(os.environ.get("XSLM_LOG_REPEAT_WINDOW", "60"))
+
+CONTEXT_FIELDS = ("job", "file", "sheet")
+_context = {field: contextvars.ContextVar(f"xslm_log_{field}", default=None) for field in CONTEXT_FIELDS}
+
+
+@contextmanager
+def log_context(**fields):
+  """
+  Tags the records logged inside the block (and in tasks it starts) with job, file and/or sheet IDs.
+
+    with log_context(file=input_file):
+      ...
+  """
+  tokens = [(_context[field], _context[field].set(value)) for field, value in fields.items() if value is not None]
+  try:
+    yield
+  finally:
+    for var, token in reversed(tokens):
+      var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+  """Copies the current log_context onto each record."""
+
+  def filter(self, record):
+    for field, var in _context.items():
+      setattr(record, field, var.get())
+    return True
+
+
+class RepeatFilter(logging.Filter):
+  """
+  Lets at most `limit` warnings or errors from the same line through per `window` seconds.
+
+  How many were dropped is reported once the line's window is over: on the line's next record
+  (in its `suppressed` attribute), or else by `sweep` through `report(pathname, lineno, levelno, count)`.
+  """
+
+  def __init__(self, limit=REPEAT_LIMIT, window=REPEAT_WINDOW, report=None):
+    super().__init__()
+    self.limit = limit
+    self.window = window
+    self.report = report
+    self._seen = {}
+    self._last_sweep = time.monotonic()
+    self._lock = threading.Lock()
+
+  def filter(self, record):
+    if record.levelno < logging.WARNING or self.limit <= 0:
+      return True
+    key = (record.pathname, record.lineno, record.levelno)
+    now = time.monotonic()
+    with self._lock:
+      start, count, suppressed = self._seen.get(key, (now, 0, 0))
+      if now - start >= self.window:
+        if suppressed:
+          record.suppressed = suppressed
+        start, count, suppressed = now, 0, 0
+      if count >= self.limit:
+        self._seen[key] = (start, count, suppressed + 1)
+        return False
+      self._seen[key] = (start, count + 1, suppressed)
+    if now - self._last_sweep >= self.window:
+      self.sweep(now)
+    return True
+
+  def sweep(self, now=None, everything=False):
+    """Reports and forgets the suppressed records of lines whose window is over (of all lines with `everything`)."""
+    now = time.monotonic() if now is None else now
+    with self._lock:
+      self._last_sweep = now
+      expired = [key for key, (start, _, _) in self._seen.items() if everything or now - start >= self.window]
+      reports = [(key, self._seen.pop(key)[2]) for key in expired]
+    if self.report is not None:
+      for key, suppressed in reports:
+        if suppressed:
+          self.report(*key, suppressed)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+  """QueueHandler that leaves formatting, tracebacks included, to the listener thread."""
+
+  def prepare(self, record):
+    # Only the message is resolved here, since its arguments may change once we return
+    record.msg = record.getMessage()
+    record.args = None
+    return record
+
+
+class TextFormatter(logging.Formatter):
+  def __init__(self):
+    super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+  def formatMessage(self, record):
+    # The context goes on the message line, before any traceback
+    text = super().formatMessage(record)
+    context = " ".join(f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS if getattr(record, field, None))
+    if context:
+      text = f"{text} [{context}]"
+    suppressed = getattr(record, "suppressed", 0)
+    if suppressed and not getattr(record, "summary", False):
+      text = f"{text} (+{suppressed} similar records suppressed)"
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+  """One JSON object per record, with the log_context fields as keys."""
+
+  def format(self, record):
+    entry = {
+      "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+      "level": record.levelname,
+      "logger": record.name,
+      "message": record.getMessage(),
+    }
+    for field in CONTEXT_FIELDS:
+      if getattr(record, field, None):
+        entry[field] = getattr(record, field)
+    if getattr(record, "suppressed", 0):
+      entry["suppressed"] = record.suppressed
+    if record.exc_info:
+      entry["exception"] = self.formatException(record.exc_info)
+    return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def make_formatter(log_format=None):
+  return JsonFormatter() if (log_format or LOG_FORMAT) == "json" else TextFormatter()
+
+
+_handlers = []
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _restart_listener():
+  """(Re)starts the listener thread writing the queue to `_handlers`."""
+  global _listener
+  with _listener_lock:
+    if _listener is not None:
+      _listener.stop()  # drains what is already queued
+    _listener = QueueListener(_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+  _repeat_filter.sweep(everything=True)
+  with _listener_lock:
+    if _listener is not None:
+      _listener.stop()
+
+
+def _report_suppressed(pathname, lineno, levelno, count):
+  record = logging.LogRecord(__name__, levelno, pathname, lineno, f"{count} similar records from {os.path.basename(pathname)}:{lineno} were suppressed", None, None)
+  record.suppressed = count
+  record.summary = True
+  for field in CONTEXT_FIELDS:
+    setattr(record, field, None)
+  # Straight onto the queue: this summary must not be rate limited itself
+  _queue.put_nowait(record)
+
+
+_queue = queue.SimpleQueue()
+_repeat_filter = RepeatFilter(report=_report_suppressed)
+atexit.register(_stop_listener)
+
 
 def configure_logger(log_level='INFO', log_file_path=None):
   """
   Configures a Python logger with the specified log level and optional file output.
 
   Args:
-    log_level: The logging level (e.g., 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'). 
+    log_level: The logging level (e.g., 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL').
                 Defaults to 'INFO'.
     log_file_path: Optional path to the log file. If None, logs to console only.
 
@@ -17,24 +215,48 @@ def configure_logger(log_level='INFO', log_file_path=None):
   logger = logging.getLogger(__name__)
   logger.setLevel(log_level)
 
-  # Default message format
-  formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+  queue_handler = _NonBlockingQueueHandler(_queue)
+  queue_handler.addFilter(_repeat_filter)
+  queue_handler.addFilter(ContextFilter())
+  logger.addHandler(queue_handler)
 
-  # Create console handler
+  # The console and file handlers run on the listener thread
   console_handler = logging.StreamHandler()
-  console_handler.setFormatter(formatter)
-  logger.addHandler(console_handler)
-
-  # Create file handler if log_file_path is provided
+  console_handler.setFormatter(make_formatter())
+  _handlers.append(console_handler)
   if log_file_path:
-    file_handler = logging.FileHandler(log_file_path)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    _handlers.append(_file_handler(log_file_path))
+  _restart_listener()
+
+  return logger
+
+
+def _file_handler(log_file_path):
+  file_handler = RotatingFileHandler(log_file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+  file_handler.setFormatter(make_formatter())
+  return file_handler
 
+
+def default_log_file():
+  """The app's dated log file name, e.g. 2024-5-17-translate_app.log, in the working directory."""
+  date = datetime.now(timezone.utc)
+  date_string = f"{date.year}-{date.month}-{date.day}"
+  return f'{date_string}-translate_app.log'
+
+
+def enable_file_logging(log_file_path=None):
+  """
+  Adds a rotating file handler to the shared logger (the dated default file when no path is given).
+
+  Importing this module only logs to the console; entry points that want a log file call this once.
+  """
+  log_file_path = os.path.abspath(log_file_path or default_log_file())
+  for handler in _handlers:
+    if isinstance(handler, logging.FileHandler) and handler.baseFilename == log_file_path:
+      return logger
+  _handlers.append(_file_handler(log_file_path))
+  _restart_listener()
   return logger
 
 
-date = datetime.now(timezone.utc)
-date_string = f"{date.year}-{date.month}-{date.day}"
-log_file = f'{date_string}-translate_app.log'
-logger = configure_logger(log_level='DEBUG', log_file_path=log_file) 
\ No newline at end of file
+logger = configure_logger(log_level=LOG_LEVEL)
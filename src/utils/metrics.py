@@ -0,0 +1,224 @@
+"""
+Process-wide metrics: counters and histograms for cells, requests and files.
+
+Every job in the process adds to the same REGISTRY, so a job's own numbers are the
+difference between two snapshots (see `delta`). The registry renders itself in the
+Prometheus text exposition format, served by `start_metrics_server`.
+"""
+import os
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.logging_mech import logger
+from utils.buffers import source_size
+
+METRICS_HOST = os.environ.get("XSLM_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("XSLM_METRICS_PORT", "9464"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum {self.sum}")
+            lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Gauge:
+    """
+    A value read when the registry is rendered, e.g. a queue's depth: `collect` returns a number,
+    or {label value: number} for one sample per value of `label`.
+    """
+
+    def __init__(self, name, documentation, collect, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.label = label
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.collect()
+        except Exception as e:
+            logger.warning(f"Could not collect {self.name}: {e}")
+            return lines
+        if self.label is None:
+            lines.append(f"{self.name} {value}")
+        else:
+            lines.extend(f'{self.name}{{{self.label}="{key}"}} {sample}' for key, sample in value.items())
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args)
+            return self._metrics[name]
+
+    def counter(self, name, documentation):
+        return self._register(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets):
+        return self._register(Histogram, name, documentation, buckets)
+
+    def gauge(self, name, documentation, collect, label=None):
+        return self._register(Gauge, name, documentation, collect, label)
+
+    def snapshot(self):
+        """{metric_name: value} for counters and {metric_name: {"count", "sum"}} for histograms; gauges are left out."""
+        return {name: metric.snapshot() for name, metric in self._metrics.items() if not isinstance(metric, Gauge)}
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def delta(before, after):
+    """What happened between two snapshots, e.g. the numbers of one job."""
+    result = {}
+    for name, value in after.items():
+        previous = before.get(name)
+        if isinstance(value, dict):
+            previous = previous or {"count": 0, "sum": 0.0}
+            result[name] = {key: value[key] - previous[key] for key in value}
+        else:
+            result[name] = value - (previous or 0)
+    return result
+
+
+REGISTRY = MetricsRegistry()
+
+CELLS_SCANNED = REGISTRY.counter("xslm_cells_scanned_total", "Non-empty cells (or shared strings) read from workbooks.")
+CELLS_SKIPPED = REGISTRY.counter("xslm_cells_skipped_total", "Scanned cells left untranslated: numbers, formulas, empty strings.")
+CELLS_FILTERED = REGISTRY.counter("xslm_cells_filtered_total", "Skipped cells the classifier recognised as numbers, dates, codes, URLs, text already in the target language and so on.")
+CELLS_TRANSLATED = REGISTRY.counter("xslm_cells_translated_total", "Cells written back with a translation.")
+STRINGS_REQUESTED = REGISTRY.counter("xslm_strings_requested_total", "Strings asked of the deduplicator.")
+DEDUP_HITS = REGISTRY.counter("xslm_dedup_hits_total", "Strings served from an earlier or in-flight translation of the same job.")
+CACHE_HITS = REGISTRY.counter("xslm_cache_hits_total", "Strings served from the translation memory.")
+CACHE_MISSES = REGISTRY.counter("xslm_cache_misses_total", "Strings looked up in the translation memory and not found.")
+GLOSSARY_RESOLVED = REGISTRY.counter("xslm_glossary_resolved_total", "Strings translated from the glossary alone, without a request.")
+GLOSSARY_MASKED = REGISTRY.counter("xslm_glossary_masked_total", "Strings sent with their glossary terms masked by placeholders.")
+GLOSSARY_LOST = REGISTRY.counter("xslm_glossary_placeholders_lost_total", "Glossary placeholders missing from a translation, so their terms could not be restored.")
+CELLS_SEGMENTED = REGISTRY.counter("xslm_cells_segmented_total", "Strings too long for one request, sent as segments and reassembled.")
+SEGMENTS = REGISTRY.counter("xslm_segments_total", "Segments cut from the long strings.")
+REQUESTS_SENT = REGISTRY.counter("xslm_requests_total", "Requests sent to the translation backend.")
+REQUEST_ERRORS = REGISTRY.counter("xslm_request_errors_total", "Backend requests that failed, throttling included.")
+THROTTLED = REGISTRY.counter("xslm_throttled_total", "Backend requests rejected with 429/503.")
+RETRIES = REGISTRY.counter("xslm_retries_total", "Backend requests sent again after a failure.")
+BATCH_SPLITS = REGISTRY.counter("xslm_batch_splits_total", "Failing batches split in half to isolate the strings that fail.")
+HEDGED = REGISTRY.counter("xslm_hedged_requests_total", "Duplicate requests sent because the first outlasted the latency percentile.")
+STRINGS_FAILED = REGISTRY.counter("xslm_strings_failed_total", "Strings left in their source language because every attempt failed.")
+FILES_TRANSLATED = REGISTRY.counter("xslm_files_translated_total", "Workbooks translated and saved.")
+FILES_FAILED = REGISTRY.counter("xslm_files_failed_total", "Workbooks that could not be translated.")
+BYTES_IN = REGISTRY.counter("xslm_bytes_in_total", "Bytes of input workbooks translated.")
+BYTES_OUT = REGISTRY.counter("xslm_bytes_out_total", "Bytes of translated workbooks written.")
+BATCH_ITEMS = REGISTRY.histogram("xslm_batch_items", "Strings per backend request.", [1, 2, 5, 10, 25, 50, 100, 250])
+BATCH_CHARS = REGISTRY.histogram("xslm_batch_chars", "Characters per backend request.", [100, 500, 1000, 2000, 4500, 10000])
+BACKEND_LATENCY = REGISTRY.histogram("xslm_backend_latency_seconds", "Duration of backend requests.",
+                                     [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30])
+
+
+def record_cells(scanned, translatable):
+    CELLS_SCANNED.inc(scanned)
+    CELLS_SKIPPED.inc(scanned - translatable)
+
+
+def record_file(input_file, output_file):
+    FILES_TRANSLATED.inc()
+    BYTES_IN.inc(source_size(input_file))
+    BYTES_OUT.inc(source_size(output_file))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        self.send_metrics()
+
+    def send_metrics(self):
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would flood the log
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT, registry=REGISTRY):
+    """
+    Serves `registry` at http://host:port/metrics from a daemon thread.
+
+    Returns the server, or None when the port cannot be bound (e.g. another process already serves it).
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="xslm-metrics", daemon=True).start()
+    logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,58 @@
+"""
+CPU-bound workbook stages of folder jobs, run in a ProcessPoolExecutor.
+
+The functions here are executed in worker processes, so they take and return only
+plain, picklable data and never touch the event loop.
+"""
+from openpyxl import load_workbook
+from utils.row_ds import no_translate_value
+
+
+def extract_cells(input_file):
+    """
+    Reads a workbook and returns its translatable cells as [(sheet_title, rows, cols, texts)].
+
+    The workbook is opened read-only since only values are needed here; the styled,
+    macro-preserving load happens once, in apply_translations.
+    """
+    return extract_cells_counted(input_file)[0]
+
+
+def extract_cells_counted(input_file):
+    """extract_cells, also returning the number of non-empty cells scanned (for metrics)."""
+    wb = load_workbook(input_file, read_only=True)
+    try:
+        sheets = []
+        scanned = 0
+        for ws in wb.worksheets:
+            ws.reset_dimensions()
+            rows, cols, texts = [], [], []
+            for row in ws.iter_rows():
+                for cell in row:
+                    if cell.value is not None:
+                        scanned += 1
+                    if no_translate_value(cell.value):
+                        continue
+                    rows.append(cell.row)
+                    cols.append(cell.column)
+                    texts.append(cell.value)
+            sheets.append((ws.title, rows, cols, texts))
+        return sheets, scanned
+    finally:
+        wb.close()
+
+
+def apply_translations(input_file, output_file, sheets, translations):
+    """
+    Writes the translated workbook: `sheets` is extract_cells' result and `translations`
+    maps source text to translated text. Macros are preserved.
+    """
+    wb = load_workbook(input_file, keep_vba=True)
+    for title, rows, cols, texts in sheets:
+        ws = wb[title]
+        for row, col, text in zip(rows, cols, texts):
+            translated = translations.get(text)
+            if translated is not None:
+                ws.cell(row=row, column=col).value = translated
+    wb.save(output_file)
+    return output_file
@@ -0,0 +1,84 @@
+"""
+Building blocks for sending batches to a flaky backend: jittered exponential backoff, a
+job-level retry budget, and the latency percentile after which a request is hedged.
+"""
+import os
+import random
+from collections import deque
+
+# Attempts of a batch beyond the first, before it is split in half
+MAX_RETRIES = int(os.environ.get("XSLM_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("XSLM_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("XSLM_RETRY_MAX_DELAY", "20"))
+# Retries and halves a job may send: this many to start with...
+RETRY_BUDGET_MIN = float(os.environ.get("XSLM_RETRY_BUDGET_MIN", "20"))
+# ...plus this fraction of the batches it sends
+RETRY_BUDGET_RATIO = float(os.environ.get("XSLM_RETRY_BUDGET_RATIO", "0.2"))
+# A request still running past this percentile of recent latencies is sent a second time; 0 disables hedging
+HEDGE_PERCENTILE = float(os.environ.get("XSLM_HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("XSLM_HEDGE_MIN_SAMPLES", "20"))
+# Hedges have an allowance of their own, so they never use up the retries: a few, plus this fraction of the batches
+HEDGE_BUDGET_MIN = float(os.environ.get("XSLM_HEDGE_BUDGET_MIN", "5"))
+HEDGE_BUDGET_RATIO = float(os.environ.get("XSLM_HEDGE_BUDGET_RATIO", "0.05"))
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Seconds to wait before retry number `attempt` (1-based): full jitter over an exponential ceiling."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(exc):
+    """False for errors that sending the same batch again cannot fix, i.e. client errors other than 408/429."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status not in (408, 429))
+
+
+class RetryBudget:
+    """
+    Caps the extra requests of a job, so a failing backend is not hit with several times the
+    normal load: every batch sent earns `ratio` of a token on top of `initial`, and each extra
+    request spends one.
+    """
+
+    def __init__(self, initial=RETRY_BUDGET_MIN, ratio=RETRY_BUDGET_RATIO):
+        self.balance = initial
+        self.ratio = ratio
+        self.spent = 0
+        self.denied = 0
+
+    def earn(self):
+        self.balance += self.ratio
+
+    def spend(self):
+        if self.balance < 1:
+            self.denied += 1
+            return False
+        self.balance -= 1
+        self.spent += 1
+        return True
+
+
+class LatencyTracker:
+    """Recent request latencies, and the percentile of them after which a request is hedged."""
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES, window=256):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._threshold = None
+        self._stale = 0
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+        self._stale += 1
+
+    def hedge_delay(self):
+        """Seconds after which to hedge, or None while hedging is off or there are too few samples."""
+        if not self.percentile or len(self._samples) < self.min_samples:
+            return None
+        # Sorting the window on every request would cost more than it saves
+        if self._threshold is None or self._stale >= 16:
+            ordered = sorted(self._samples)
+            self._threshold = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+            self._stale = 0
+        return self._threshold
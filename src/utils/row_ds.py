@@ -1,32 +1,6 @@
-from collections import deque
-from googletrans import Translator
-import asyncio
-from utils.logging_mech import logger
-import traceback
-
-
-# class Cell:
-#     def __init__(self, val):
-#         self.value = val
-
-# class Row:
-#     def __init__(self, data: list):
-#         self.data = [Cell(val) for val in data]
-#         self.index = 0
-
-#     def __iter__(self):
-#         return self
-
-#     def __next__(self):
-#         if self.index < len(self.data):
-#             result = self.data[self.index]
-#             self.index += 1
-#             return result
-#         else:
-#             raise StopIteration
-        
-#     def __len__(self):
-#         return len(self.data)
+from array import array
+
+
 class CancellationException(Exception):
     pass
 
@@ -41,72 +15,89 @@ class CancellationToken:
         return self._is_cancelled
 
 
-class TranslateRow:
-
-    def __init__(self, row):
-        self.row = row
-        self.row_len = len(self.row)
-        self.no_translate_queue = deque()
-        self.no_translate_idx = []
-        self.pre_translate_queue = deque()
-        self.post_translate_queue = deque()
-        self.rebuilt_queue = deque()
-
-    @staticmethod
-    def no_translate_cell(cell):
-
-        if not isinstance(cell.value, str):
-            return True
-        
-        if not cell.value:
-            return True
-        
-        if cell.value.startswith("="):
-            return True
-        
-        return False
-
-    def prepare_data_to_translate(self):
-
-
-        for idx, cell in enumerate(self.row):
-            if self.no_translate_cell(cell):
-                self.no_translate_idx.append(idx)
-                self.no_translate_queue.append(cell.value)
-            else:
-                self.pre_translate_queue.append(cell.value)
-
-
-    async def translate_row(self, src, dest, cancellation_token):
-        async with Translator() as translator:
-            if cancellation_token.is_cancelled():
-                raise CancellationException
-            translations = await translator.translate(list(self.pre_translate_queue), src=src, dest=dest)
-
-            for translation in translations:
-                self.post_translate_queue.append(translation.text)
-
-
-    def post_translation_rebuild(self):
-
-        assert len(self.pre_translate_queue) == len(self.post_translate_queue), "Pre and post translate queue are of different length"
-
-        for idx in range(self.row_len):
-            if idx in self.no_translate_idx:
-                self.rebuilt_queue.append(self.no_translate_queue.popleft())
-            else:
-                self.rebuilt_queue.append(self.post_translate_queue.popleft())
-
-
-    async def perform_translation(self, src, dest, cancellation_token):
-
-        self.prepare_data_to_translate()
-
-        try:
-            await self.translate_row(src, dest, cancellation_token)
-            self.post_translation_rebuild()
-            return list(self.rebuilt_queue)
-        except Exception as exc:
-            t = traceback.format_exc()
-            logger.error(f"Error originates: {t}")
-            logger.error(f"Error while translating {exc}")
\ No newline at end of file
+def no_translate_value(value):
+    """True for cell values that are never sent: non-strings, empty strings and formulas."""
+
+    if not isinstance(value, str):
+        return True
+    
+    if not value:
+        return True
+    
+    if value.startswith("="):
+        return True
+    
+    return False
+
+
+class SheetCells:
+    """
+    The translatable cells of a sheet (or of a window of its rows) in columnar form.
+
+    `rows` and `cols` hold each cell's 1-based position within the rows it was collected
+    from, and `text_ids` the index of its text in `texts`, the table of distinct strings.
+    Each text is stored once and translated once: translations come back aligned with
+    `texts` and are scattered to the cells in a single pass.
+    """
+
+    __slots__ = ("title", "rows", "cols", "text_ids", "texts", "scanned", "_ids")
+
+    def __init__(self, title=None):
+        self.title = title
+        self.rows = array("I")
+        self.cols = array("I")
+        self.text_ids = array("I")
+        self.texts = []
+        self.scanned = 0  # non-empty cells seen, translatable or not
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.text_ids)
+
+    @classmethod
+    def from_rows(cls, rows, title=None, sheet_filter=None):
+        """
+        Collects the translatable cells of `rows`, tuples of openpyxl cells as yielded by
+        `iter_rows()`; `sheet_filter` is an optional classifier SheetFilter.
+        """
+        cells = cls(title)
+        for row_idx, row in enumerate(rows, start=1):
+            for col_idx, cell in enumerate(row, start=1):
+                value = cell.value
+                if value is None:
+                    continue
+                cells.scanned += 1
+                if no_translate_value(value) or (sheet_filter is not None and sheet_filter(col_idx, value) is not None):
+                    continue
+                cells.add(row_idx, col_idx, value)
+        return cells
+
+    def add(self, row, col, text):
+        text_id = self._ids.get(text)
+        if text_id is None:
+            text_id = self._ids[text] = len(self.texts)
+            self.texts.append(text)
+        self.rows.append(row)
+        self.cols.append(col)
+        self.text_ids.append(text_id)
+
+    def translated_count(self, translations):
+        """How many cells get a translation from `translations` (aligned with `texts`; None means none)."""
+        return sum(1 for text_id in self.text_ids if translations[text_id] is not None)
+
+    def write(self, ws, translations):
+        """
+        Sets every cell of an openpyxl worksheet to its translation, or back to its source
+        text where `translations` has None. The positions must be the worksheet's coordinates,
+        i.e. the cells were collected from `ws.iter_rows()`.
+        """
+        values = [text if translated is None else translated for text, translated in zip(self.texts, translations)]
+        for row, col, text_id in zip(self.rows, self.cols, self.text_ids):
+            ws.cell(row=row, column=col).value = values[text_id]
+
+    def fill(self, values, translations):
+        """Like `write`, for rows given as lists of values (e.g. a streaming window), updated in place."""
+        for row, col, text_id in zip(self.rows, self.cols, self.text_ids):
+            translated = translations[text_id]
+            if translated is not None:
+                values[row - 1][col - 1] = translated
@@ -0,0 +1,137 @@
+import os
+import re
+import time
+import random
+import asyncio
+from utils.logging_mech import logger
+from utils import metrics
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("XSLM_MAX_CONCURRENCY", "8"))
+DEFAULT_RATE_LIMIT = float(os.environ.get("XSLM_RATE_LIMIT", "20"))  # requests per second
+DEFAULT_BURST = float(os.environ.get("XSLM_BURST", "40"))
+DEFAULT_MIN_RATE = float(os.environ.get("XSLM_MIN_RATE", "1"))
+
+_THROTTLE_PATTERN = re.compile(r"\b(429|503)\b")
+
+
+def is_throttle_error(exc):
+    """True when the backend told us to slow down (HTTP 429/503), as opposed to any other failure."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status in (429, 503):
+        return True
+    return bool(_THROTTLE_PATTERN.search(str(exc)))
+
+
+class RequestScheduler:
+    """
+    Central gate for every backend request of a job.
+
+    - at most `max_concurrency` requests are in flight at once
+    - a token bucket refilled at `rate` requests/second (up to `burst` tokens) paces them
+    - the rate adapts AIMD-style: it grows by `increase` after each successful request up
+      to `max_rate`, is multiplied by `decrease` on a failure, and a throttling response
+      (429/503) additionally pauses all requests with an exponential, jittered backoff
+      and the throttled request is queued again, up to `max_throttle_retries` times and,
+      when `run` is given a retry budget (see utils.resilience.RetryBudget), only while it lasts
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_BURST,
+                 min_rate=DEFAULT_MIN_RATE, increase=0.5, decrease=0.5, max_backoff=60.0, max_throttle_retries=5):
+        self.max_concurrency = max_concurrency
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = max(burst, 1.0)
+        self.increase = increase
+        self.decrease = decrease
+        self.max_backoff = max_backoff
+        self.max_throttle_retries = max_throttle_retries
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_throttles = 0
+        self._bucket_lock = asyncio.Lock()
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def _acquire_tokens(self, cost):
+        # The lock makes waiters take tokens in arrival order instead of racing for each refill
+        async with self._bucket_lock:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                self._refill()
+                # A request costing more than the whole bucket may go once the bucket is full
+                needed = min(cost, self.burst)
+                if self._tokens >= needed:
+                    self._tokens -= cost
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+    def _on_success(self):
+        self._consecutive_throttles = 0
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def _on_failure(self, exc):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        if is_throttle_error(exc):
+            self.throttled += 1
+            metrics.THROTTLED.inc()
+            self._consecutive_throttles += 1
+            backoff = min(self.max_backoff, 2 ** self._consecutive_throttles)
+            backoff *= random.uniform(0.5, 1.0)
+            self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+            logger.warning(f"Backend throttled the job, pausing {backoff:.1f}s; rate now {self.rate:.1f} req/s")
+        else:
+            self.errors += 1
+        metrics.REQUEST_ERRORS.inc()
+
+    async def run(self, func, *args, cost=1, retry_budget=None):
+        """
+        Runs `await func(*args)` once a concurrency slot and `cost` rate tokens are available.
+
+        Re-queueing a throttled request spends a token of `retry_budget` when given, so it counts
+        towards the same job-wide cap as the caller's own retries.
+        """
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._acquire_tokens(cost)
+                self.requests += 1
+                metrics.REQUESTS_SENT.inc()
+                started = time.perf_counter()
+                try:
+                    result = await func(*args)
+                except Exception as exc:
+                    metrics.BACKEND_LATENCY.observe(time.perf_counter() - started)
+                    self._on_failure(exc)
+                    if (is_throttle_error(exc) and attempt < self.max_throttle_retries
+                            and (retry_budget is None or retry_budget.spend())):
+                        # Queue it again; the pause set by _on_failure holds it back
+                        attempt += 1
+                        metrics.RETRIES.inc()
+                        continue
+                    raise
+                metrics.BACKEND_LATENCY.observe(time.perf_counter() - started)
+                self._on_success()
+                return result
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "rate": round(self.rate, 2),
+            "max_concurrency": self.max_concurrency,
+        }
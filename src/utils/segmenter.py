@@ -0,0 +1,88 @@
+"""
+Cuts strings too long for one request into segments that are translated on their own and
+put back together.
+
+A long string is cut at line breaks where it can be, after a sentence where a line is too
+long, and between words only inside a sentence that is too long on its own. Consecutive
+lines and sentences are packed back together up to the limit, so each segment gives the
+engine as much context as fits in one request. The whitespace around each segment is kept
+aside and put back, so the newlines between segments come back exactly as they were.
+"""
+import os
+import re
+
+# Strings longer than this are segmented (never more than the backend accepts in one request)
+MAX_SEGMENT_CHARS = int(os.environ.get("XSLM_MAX_SEGMENT_CHARS", "2000"))
+
+_LINE_END = re.compile(r"\n")
+# Closing quotes and brackets stay with their sentence; CJK full stops need no space after them
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’»)\]]*\s+|[。！？]+[」』）]*\s*")
+_SPACE = re.compile(r"\s+")
+
+
+def _cut_after(text, pattern):
+    """`text` cut after every match of `pattern`."""
+    start = 0
+    for match in pattern.finditer(text):
+        if match.end() < len(text):
+            yield text[start:match.end()]
+            start = match.end()
+    yield text[start:]
+
+
+def _units(text, max_chars):
+    """`text` cut as little as needed: its lines, the sentences of lines too long, the words of sentences too long."""
+    for line in _cut_after(text, _LINE_END):
+        if len(line) <= max_chars:
+            yield line
+            continue
+        for sentence in _cut_after(line, _SENTENCE_END):
+            if len(sentence) <= max_chars:
+                yield sentence
+            else:
+                yield from _cut_after(sentence, _SPACE)
+
+
+def split_text(text, max_chars=MAX_SEGMENT_CHARS):
+    """
+    Pieces of at most `max_chars` characters that join back into `text`. Consecutive lines and
+    sentences are packed together up to the limit, so the engine keeps as much context as it can.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    piece = ""
+    for unit in _units(text, max_chars):
+        if piece and len(piece) + len(unit) > max_chars:
+            pieces.append(piece)
+            piece = ""
+        while len(unit) > max_chars:
+            # A single word longer than the limit: nothing better than cutting it
+            pieces.append(unit[:max_chars])
+            unit = unit[max_chars:]
+        piece += unit
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def segment(text, max_chars=MAX_SEGMENT_CHARS):
+    """
+    The pieces of `text` as (leading whitespace, text to translate, trailing whitespace);
+    the text to translate is empty for a piece that is only whitespace.
+    """
+    segments = []
+    for piece in split_text(text, max_chars):
+        core = piece.strip()
+        if not core:
+            segments.append((piece, "", ""))
+            continue
+        start = piece.index(core)
+        segments.append((piece[:start], core, piece[start + len(core):]))
+    return segments
+
+
+def reassemble(segments, translations):
+    """Joins the translations of the segments' texts back together with their whitespace."""
+    translations = iter(translations)
+    return "".join(lead + (next(translations) if core else "") + trail for lead, core, trail in segments)
@@ -0,0 +1,397 @@
+"""
+HTTP job service: other systems submit workbooks over HTTP and worker processes translate them.
+
+Jobs go through the durable JobQueue (utils.job_queue), so they survive restarts and any number
+of workers, on this host or on others sharing the queue directory, take them in parallel. Each
+worker runs one job at a time with its own backend, scheduler and translation memory handle.
+
+    POST   /jobs?dest=de[&src=en&name=report.xlsx]   the workbook as the request body
+    POST   /jobs                                     {"path": ..., "dest": ..., "src": ..., "options": {...}}
+    GET    /jobs                                     recent jobs
+    GET    /jobs/<id>                                status, progress, logs and outputs
+    POST   /jobs/<id>/cancel  (or DELETE /jobs/<id>)
+    GET    /jobs/<id>/download[?lang=de]             the translated workbook
+    GET    /metrics, /health
+
+When MAX_PENDING jobs are waiting, submissions get 503 with a Retry-After header.
+"""
+import os
+import json
+import time
+import signal
+import socket
+import asyncio
+import shutil
+import multiprocessing
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer
+from utils.logging_mech import logger, log_context
+from utils.metrics import _MetricsHandler
+from utils.job_queue import JobQueue, QueueFull, LeaseLost, QUEUE_DIR
+from utils.jobs import JobLog, DONE, FAILED, CANCELLED
+from utils.row_ds import CancellationToken
+from utils.backends import create_backend
+from utils.scheduler import RequestScheduler
+from utils.tm_cache import TranslationMemory, DEFAULT_TM_PATH
+from utils.handler import translate_file, translate_folder, TRANSLATION_BACKEND, BACKEND_OPTIONS
+from utils import metrics
+
+SERVICE_HOST = os.environ.get("XSLM_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("XSLM_SERVICE_PORT", "8765"))
+SERVICE_WORKERS = int(os.environ.get("XSLM_SERVICE_WORKERS", "2"))
+MAX_UPLOAD_BYTES = int(float(os.environ.get("XSLM_SERVICE_MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+# The paths of path jobs, and their output_dir, must be inside this directory when set
+SERVICE_ROOT = os.environ.get("XSLM_SERVICE_ROOT")
+# Seconds an idle worker waits before looking at the queue again
+POLL_INTERVAL = float(os.environ.get("XSLM_QUEUE_POLL", "1"))
+# Seconds between a running job's heartbeats, which also pick up cancellations
+HEARTBEAT_INTERVAL = float(os.environ.get("XSLM_QUEUE_HEARTBEAT", "5"))
+
+# Options a submission may pass on to translate_file / translate_folder
+JOB_OPTIONS = {"file": {"engine", "incremental", "output_dir"}, "folder": {"resume", "output_dir"}}
+UPLOAD_OPTIONS = {"engine"}
+WORKBOOK_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".xlsm": "application/vnd.ms-excel.sheet.macroEnabled.12",
+}
+JOB_LOG_LINES = 200
+
+JOBS_SUBMITTED = metrics.REGISTRY.counter("xslm_jobs_submitted_total", "Jobs accepted by the HTTP service.")
+JOBS_REJECTED = metrics.REGISTRY.counter("xslm_jobs_rejected_total", "Submissions refused because the queue was full.")
+
+
+def register_queue_metrics(queue):
+    metrics.REGISTRY.gauge("xslm_queue_jobs", "Jobs in the queue by status.", queue.depth, label="status")
+    metrics.REGISTRY.gauge("xslm_queue_oldest_queued_seconds", "How long the oldest queued job has been waiting.", queue.oldest_queued_age)
+    metrics.REGISTRY.gauge("xslm_queue_max_pending", "Queued jobs beyond which submissions are refused.", lambda: queue.max_pending)
+
+
+def parse_languages(value):
+    """A language, a list or a comma-separated string; a list only when there are several (see handler.fan_out)."""
+    languages = value if isinstance(value, list) else [lang.strip() for lang in str(value or "").split(",")]
+    languages = [lang for lang in languages if lang]
+    if not languages:
+        raise ValueError("dest needs at least one language")
+    return languages[0] if len(languages) == 1 else languages
+
+
+class JobProgress:
+    """The progress bar handed to the handlers; the heartbeat reports its last value."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def progress(self, value):
+        self.value = min(value, 1.0)
+
+
+# Worker processes
+
+
+def run_worker(directory, name, stop_event, use_memory=True):
+    """Process target: takes jobs from the queue in `directory` until `stop_event` is set."""
+    # Ctrl-C reaches the whole process group; the parent stops workers through stop_event instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(work(JobQueue(directory), name, stop_event, use_memory))
+
+
+async def work(queue, name, stop_event, use_memory=True):
+    translator = create_backend(TRANSLATION_BACKEND, **BACKEND_OPTIONS)
+    scheduler = RequestScheduler()
+    translation_memory = None
+    if use_memory:
+        translation_memory = TranslationMemory(DEFAULT_TM_PATH)
+    logger.info(f"Worker {name} started on {queue.directory}")
+    try:
+        while not stop_event.is_set():
+            job = await asyncio.to_thread(queue.claim, name)
+            if job is None:
+                await asyncio.to_thread(queue.housekeeping)
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            with log_context(job=job["id"]):
+                await run_job(queue, job, translator, scheduler, translation_memory, stop_event)
+    finally:
+        await translator.aclose()
+        if translation_memory is not None:
+            translation_memory.close()
+        queue.close()
+        logger.info(f"Worker {name} stopped")
+
+
+async def run_job(queue, job, translator, scheduler, translation_memory, stop_event):
+    handler = translate_file if job["kind"] == "file" else translate_folder
+    options = dict(job["options"])
+    if job["upload"]:
+        options["output_dir"] = queue.job_dir(job["id"])
+    token = CancellationToken()
+    progress = JobProgress()
+    log = JobLog()
+    requested = {"cancel": False, "lost": False}
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                requested["cancel"] = await asyncio.to_thread(queue.heartbeat, job["id"], job["worker"], progress.value)
+            except LeaseLost:
+                # Too long without a heartbeat: another worker has the job now, so stop duplicating its work
+                logger.warning(f"Job {job['id']} was handed to another worker, stopping")
+                requested["lost"] = True
+                token.cancel()
+                return
+            if requested["cancel"] or stop_event.is_set():
+                token.cancel()
+
+    logger.info(f"Running {job['kind']} job {job['id']} (attempt {job['attempts']}): {job['input']}")
+    baseline = metrics.REGISTRY.snapshot()
+    beat = asyncio.create_task(heartbeat())
+    result, error = None, None
+    try:
+        result = await handler(job["input"], job["src"], job["dest"], token, log, progress, translator=translator,
+                               scheduler=scheduler, translation_memory=translation_memory, **options)
+        status = CANCELLED if token.is_cancelled() else DONE
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed: {e}")
+        status, error = FAILED, str(e)
+    finally:
+        beat.cancel()
+
+    if status == CANCELLED and not requested["cancel"] and not requested["lost"]:
+        # Stopped by a worker shutdown rather than by the user: let another worker take it
+        if await asyncio.to_thread(queue.release, job["id"], job["worker"]):
+            logger.info(f"Job {job['id']} released by the worker (queued again unless cancelled meanwhile)")
+        return
+    if not await asyncio.to_thread(queue.finish, job["id"], job["worker"], status, result, error, log.messages[-JOB_LOG_LINES:],
+                                   metrics.delta(baseline, metrics.REGISTRY.snapshot())):
+        logger.warning(f"Discarding the outcome of job {job['id']} ({status}): another worker has it now")
+        return
+    logger.info(f"Job {job['id']} {status}")
+
+
+# HTTP API
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def job_view(job):
+    """What the API shows of a job: its row, with download links for finished file jobs."""
+    view = {key: job[key] for key in ("id", "kind", "src", "dest", "status", "progress", "result", "error",
+                                      "logs", "metrics", "worker", "attempts", "created", "started", "finished")}
+    view["input"] = os.path.basename(job["input"]) if job["upload"] else job["input"]
+    if job["status"] == DONE and job["kind"] == "file" and job["result"]:
+        if isinstance(job["result"], dict):
+            view["downloads"] = {lang: f"/jobs/{job['id']}/download?lang={lang}" for lang, output in job["result"].items() if output}
+        else:
+            view["downloads"] = {job["dest"]: f"/jobs/{job['id']}/download"}
+    return view
+
+
+class _ServiceHandler(_MetricsHandler):
+    queue = None
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if method == "GET" and parts == ["metrics"]:
+                return self.send_metrics()
+            if method == "GET" and parts == ["health"]:
+                return self.send_json(200, {"status": "ok", "queue": self.queue.depth()})
+            if parts == ["jobs"] and method == "GET":
+                return self.send_json(200, [job_view(job) for job in self.queue.jobs(int(query.get("limit", 50)))])
+            if parts == ["jobs"] and method == "POST":
+                return self.submit(query)
+            if len(parts) >= 2 and parts[0] == "jobs":
+                job = self.queue.get(parts[1])
+                if job is None:
+                    raise ServiceError(404, f"No job {parts[1]}")
+                if len(parts) == 2 and method == "GET":
+                    return self.send_json(200, job_view(job))
+                if (len(parts) == 2 and method == "DELETE") or (parts[2:] == ["cancel"] and method == "POST"):
+                    return self.send_json(200, job_view(self.queue.cancel(job["id"])))
+                if parts[2:] == ["download"] and method == "GET":
+                    return self.download(job, query.get("lang"))
+            raise ServiceError(404, f"No route for {method} {url.path}")
+        except ServiceError as e:
+            self.send_json(e.status, {"error": str(e)}, e.headers)
+        except Exception as e:
+            logger.error(f"{method} {self.path} failed: {e}", exc_info=True)
+            self.send_json(500, {"error": str(e)})
+
+    def submit(self, query):
+        if self.queue.depth()["queued"] >= self.queue.max_pending:
+            JOBS_REJECTED.inc()
+            raise ServiceError(503, "The queue is full, try again later", {"Retry-After": str(max(1, int(POLL_INTERVAL * 10)))})
+        length = int(self.headers.get("Content-Length") or 0)
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as e:
+                raise ServiceError(400, f"The request body is not valid JSON: {e}")
+            if not isinstance(body, dict):
+                raise ServiceError(400, "The request body must be a JSON object")
+            job_id = self.submit_path(body)
+        else:
+            job_id = self.submit_upload(query, length)
+        JOBS_SUBMITTED.inc()
+        self.send_json(202, job_view(self.queue.get(job_id)), {"Location": f"/jobs/{job_id}"})
+
+    def submit_path(self, body):
+        path = body.get("path")
+        if not path or not isinstance(path, str):
+            raise ServiceError(400, "path must name a file or folder")
+        # Confined first, so paths outside SERVICE_ROOT are refused alike whether they exist or not
+        path = self.confine(path)
+        if not os.path.exists(path):
+            raise ServiceError(400, f"No such file or folder: {path}")
+        kind = "folder" if os.path.isdir(path) else "file"
+        options = body.get("options") or {}
+        if not isinstance(options, dict):
+            raise ServiceError(400, "options must be a JSON object")
+        self.check_options(options, JOB_OPTIONS[kind])
+        if options.get("output_dir") is not None:
+            if not isinstance(options["output_dir"], str):
+                raise ServiceError(400, "output_dir must be a path")
+            # The service writes there, so it is held to the same root as the inputs
+            options["output_dir"] = self.confine(options["output_dir"])
+        return self.enqueue(kind, path, body.get("src") or "auto", body.get("dest"), options)
+
+    def submit_upload(self, query, length):
+        name = os.path.basename(query.get("name") or "workbook.xlsx")
+        if os.path.splitext(name)[1].lower() not in WORKBOOK_TYPES:
+            raise ServiceError(400, "name must end in .xlsx or .xlsm")
+        if not length:
+            raise ServiceError(411, "Send the workbook as the request body, with a Content-Length")
+        if length > MAX_UPLOAD_BYTES:
+            raise ServiceError(413, f"Workbooks are limited to {MAX_UPLOAD_BYTES} bytes")
+        options = {key: query[key] for key in UPLOAD_OPTIONS if key in query}
+        job_id = self.queue.new_id()
+        job_dir = self.queue.job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = os.path.join(job_dir, name)
+        try:
+            with open(input_path, "wb") as f:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        raise ServiceError(400, "The upload ended early")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            return self.enqueue("file", input_path, query.get("src") or "auto", query.get("dest"), options, upload=True, job_id=job_id)
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def confine(path):
+        """The absolute form of `path`, which must be inside SERVICE_ROOT when that is set."""
+        path = os.path.realpath(path)
+        if SERVICE_ROOT:
+            root = os.path.realpath(SERVICE_ROOT)
+            if os.path.commonpath([path, root]) != root:
+                raise ServiceError(403, f"Paths must be inside {SERVICE_ROOT}")
+        return path
+
+    @staticmethod
+    def check_options(options, allowed):
+        unknown = set(options) - allowed
+        if unknown:
+            raise ServiceError(400, f"Unknown options {sorted(unknown)}; allowed: {sorted(allowed)}")
+
+    def enqueue(self, kind, path, src_lang, dest_lang, options, upload=False, job_id=None):
+        try:
+            dest_lang = parse_languages(dest_lang)
+        except ValueError as e:
+            raise ServiceError(400, str(e))
+        try:
+            return self.queue.submit(kind, path, src_lang, dest_lang, options, upload=upload, job_id=job_id)
+        except QueueFull as e:
+            JOBS_REJECTED.inc()
+            raise ServiceError(503, str(e), {"Retry-After": str(max(1, int(POLL_INTERVAL * 10)))})
+
+    def download(self, job, lang):
+        if job["kind"] != "file" or job["status"] != DONE:
+            raise ServiceError(409, f"Job {job['id']} is {job['status']}; only finished file jobs can be downloaded")
+        output = job["result"]
+        if isinstance(output, dict):
+            if lang is None and len(output) == 1:
+                lang = next(iter(output))
+            if lang not in output:
+                raise ServiceError(400, f"Pass lang, one of {sorted(output)}")
+            output = output[lang]
+        if not output or not os.path.exists(output):
+            raise ServiceError(410, "The output is no longer available")
+        name = os.path.basename(output)
+        self.send_response(200)
+        self.send_header("Content-Type", WORKBOOK_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream"))
+        self.send_header("Content-Length", str(os.path.getsize(output)))
+        self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+        self.end_headers()
+        with open(output, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def make_server(queue, host=SERVICE_HOST, port=SERVICE_PORT):
+    """The HTTP API over `queue`, ready for serve_forever; also serves the metrics registry at /metrics."""
+    register_queue_metrics(queue)
+    handler = type("ServiceHandler", (_ServiceHandler,), {"queue": queue})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_workers(directory=QUEUE_DIR, count=SERVICE_WORKERS, use_memory=True, prefix=None):
+    """Starts `count` worker processes; returns (processes, stop_event)."""
+    # Spawned rather than forked: the parent already runs the log listener and server threads
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    prefix = prefix or f"{socket.gethostname()}-{os.getpid()}"
+    processes = []
+    for number in range(count):
+        process = context.Process(target=run_worker, args=(directory, f"{prefix}-{number}", stop_event, use_memory),
+                                  name=f"xslm-worker-{number}", daemon=False)
+        process.start()
+        processes.append(process)
+    return processes, stop_event
+
+
+def stop_workers(processes, stop_event, timeout=None):
+    """Asks the workers to stop; running jobs are handed back to the queue. Stragglers are terminated after `timeout`."""
+    stop_event.set()
+    deadline = time.monotonic() + (HEARTBEAT_INTERVAL * 2 + 10 if timeout is None else timeout)
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"Worker {process.name} did not stop in time, terminating it")
+            process.terminate()
+            process.join()
@@ -0,0 +1,142 @@
+import shutil
+import zipfile
+import xml.parsers.expat
+from xml.sax.saxutils import escape
+
+SHARED_STRINGS_PART = "xl/sharedStrings.xml"
+
+_CHUNK = 1 << 16
+
+
+def _local(name):
+    return name.rsplit(":", 1)[-1]
+
+
+class SharedStringsTable:
+    """
+    The text runs of a workbook's shared strings table, with the byte span each occupies.
+
+    Plain entries contribute their single `<t>`; rich-text entries contribute one text per
+    `<r>` run, so run formatting survives translation. Phonetic guides (`<rPh>`) are left
+    out. Spans point into the raw part, which lets `write` splice translations in and copy
+    every other byte unchanged.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.spans = []
+
+    @classmethod
+    def read(cls, stream):
+        """Stream-parses a sharedStrings.xml file object."""
+        table = cls()
+        parser = xml.parsers.expat.ParserCreate()
+        state = {"phonetic": 0, "in_text": False, "start": None, "parts": []}
+
+        def start_element(name, attrs):
+            local = _local(name)
+            if local == "rPh":
+                state["phonetic"] += 1
+            elif local == "t" and not state["phonetic"]:
+                state["in_text"] = True
+                state["start"] = None
+                state["parts"] = []
+
+        def character_data(data):
+            if state["in_text"]:
+                if state["start"] is None:
+                    state["start"] = parser.CurrentByteIndex
+                state["parts"].append(data)
+
+        def end_element(name):
+            local = _local(name)
+            if local == "rPh":
+                state["phonetic"] -= 1
+            elif local == "t" and state["in_text"]:
+                state["in_text"] = False
+                # Empty <t/> elements have nothing to translate
+                if state["start"] is not None:
+                    table.spans.append((state["start"], parser.CurrentByteIndex))
+                    table.texts.append("".join(state["parts"]))
+
+        parser.StartElementHandler = start_element
+        parser.CharacterDataHandler = character_data
+        parser.EndElementHandler = end_element
+
+        while True:
+            chunk = stream.read(_CHUNK)
+            if not chunk:
+                break
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+        return table
+
+    def write(self, src, dst, translations):
+        """
+        Copies the part from `src` to `dst`, replacing each text with its entry in `translations`.
+
+        `translations` is aligned with `texts`; a None entry keeps the original bytes.
+        """
+        position = 0
+        for (start, end), translation in zip(self.spans, translations):
+            if translation is None:
+                continue
+            _copy_bytes(src, dst, start - position)
+            dst.write(escape(translation).encode("utf-8"))
+            _copy_bytes(src, None, end - start)
+            position = end
+        shutil.copyfileobj(src, dst, _CHUNK)
+
+
+def _copy_bytes(src, dst, count):
+    """Copies (or, with dst=None, skips) exactly `count` bytes of src."""
+    while count > 0:
+        chunk = src.read(min(count, _CHUNK))
+        if not chunk:
+            raise ValueError("Shared strings part ended early")
+        if dst is not None:
+            dst.write(chunk)
+        count -= len(chunk)
+
+
+def has_inline_strings(input_file):
+    """True when any worksheet stores strings inline (t="inlineStr") instead of in the shared table."""
+    with zipfile.ZipFile(input_file) as zf:
+        for info in zf.infolist():
+            if not (info.filename.startswith("xl/worksheets/") and info.filename.endswith(".xml")):
+                continue
+            with zf.open(info) as part:
+                tail = b""
+                while True:
+                    chunk = part.read(_CHUNK)
+                    if not chunk:
+                        break
+                    if b"inlineStr" in tail + chunk:
+                        return True
+                    tail = chunk[-16:]
+    return False
+
+
+def read_shared_strings(input_file):
+    """Returns the workbook's SharedStringsTable, or None when it has no shared strings part."""
+    with zipfile.ZipFile(input_file) as zf:
+        if SHARED_STRINGS_PART not in zf.namelist():
+            return None
+        with zf.open(SHARED_STRINGS_PART) as part:
+            return SharedStringsTable.read(part)
+
+
+def write_patched_workbook(input_file, output_file, table, translations):
+    """
+    Writes a copy of the workbook with the shared strings replaced.
+
+    Every other part, vbaProject.bin included, is copied unchanged, member by member and
+    with its original compression settings.
+    """
+    with zipfile.ZipFile(input_file) as zin, zipfile.ZipFile(output_file, "w") as zout:
+        for info in zin.infolist():
+            with zin.open(info) as src, zout.open(info, "w", force_zip64=info.file_size > 0x7FFFFFFF) as dst:
+                if info.filename == SHARED_STRINGS_PART and table is not None:
+                    table.write(src, dst, translations)
+                else:
+                    shutil.copyfileobj(src, dst, _CHUNK)
@@ -0,0 +1,15 @@
+import time
+import contextlib
+
+
+@contextlib.contextmanager
+def phase(timings, name):
+    """Adds the wall time of the block to `timings[name]`; does nothing when `timings` is None."""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
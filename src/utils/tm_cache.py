@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import threading
+import unicodedata
+from utils.logging_mech import logger
+
+DEFAULT_TM_PATH = os.environ.get(
+    "XSLM_TM_PATH", os.path.join(os.path.expanduser("~"), ".xslm_translator", "translation_memory.sqlite3")
+)
+DEFAULT_MAX_ENTRIES = 500_000
+
+# SQLite caps the number of bound parameters per statement; stay well below it
+_CHUNK = 500
+
+
+class TranslationMemory:
+    """
+    Disk-backed translation memory keyed by (src_lang, dest_lang, normalized text).
+
+    Entries carry a last-used timestamp; once the table grows past `max_entries`
+    the least recently used entries are evicted. The table is only counted when the rows
+    written since the last count could have taken it past the cap, so large memories are
+    not scanned on every write. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_TM_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # An upper bound on the number of entries (replaced rows are counted as new), None until first counted
+        self._entries_bound = None
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "src TEXT NOT NULL, dest TEXT NOT NULL, text TEXT NOT NULL, "
+            "translation TEXT NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (src, dest, text)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+
+    @staticmethod
+    def normalize(text):
+        return unicodedata.normalize("NFC", text)
+
+    def get_many(self, texts, src, dest):
+        """Returns a {text: translation} dict for the texts found in memory."""
+        keys = {}
+        for text in texts:
+            keys.setdefault(self.normalize(text), []).append(text)
+
+        found = {}
+        now = time.time()
+        with self._lock:
+            normalized = list(keys)
+            for start in range(0, len(normalized), _CHUNK):
+                chunk = normalized[start:start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text, translation FROM translations WHERE src = ? AND dest = ? AND text IN ({marks})",
+                    (src, dest, *chunk),
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE translations SET last_used = ? WHERE src = ? AND dest = ? AND text = ?",
+                        [(now, src, dest, text) for text, _ in rows],
+                    )
+                for text, translation in rows:
+                    for original in keys[text]:
+                        found[original] = translation
+
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, pairs, src, dest):
+        """Stores (text, translation) pairs and evicts the least recently used entries past the cap."""
+        now = time.time()
+        rows = [(src, dest, self.normalize(text), translation, now) for text, translation in pairs]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (src, dest, text, translation, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+            if self._entries_bound is not None:
+                self._entries_bound += len(rows)
+            if self._entries_bound is None or self._entries_bound > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        self._entries_bound = count
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Evict a little more than needed so we do not evict on every single insert
+        excess += self.max_entries // 20
+        cutoff = self._conn.execute(
+            "SELECT last_used FROM translations ORDER BY last_used LIMIT 1 OFFSET ?", (excess - 1,)
+        ).fetchone()
+        if cutoff is not None:
+            self._entries_bound -= self._conn.execute("DELETE FROM translations WHERE last_used <= ?", cutoff).rowcount
+            logger.debug(f"Translation memory evicted entries used before {cutoff[0]}")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM translations")
+            self._entries_bound = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def stats(self):
+        return {"entries": len(self), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,173 @@
+"""
+Headless command line entry point, for cron and batch jobs. Run from the `src` directory:
+
+    python -m xslm report.xlsx --dest de
+    python -m xslm ./workbooks --src en --dest fr --output-dir ./out --concurrency 16
+    python -m xslm report.xlsx --dest de,fr,es,ja
+
+Each path may be a workbook or a folder (translated with translate_folder). Flags override
+the matching XSLM_* environment variables. Only the standard library is imported until the
+arguments are parsed, and Streamlit is never imported.
+"""
+import os
+import sys
+import json
+import argparse
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m xslm", description="Translate Excel workbooks without the web UI.")
+    parser.add_argument("paths", nargs="+", help="workbooks (.xlsx/.xlsm) or folders of workbooks")
+    parser.add_argument("--src", default="auto", help="source language (default: auto)")
+    parser.add_argument("--dest", required=True, help="destination language, e.g. de, or a comma-separated list such as de,fr,ja")
+    parser.add_argument("--output-dir", help="write outputs here instead of next to the inputs")
+    parser.add_argument("--concurrency", type=int, help="backend requests in flight (XSLM_MAX_CONCURRENCY)")
+    parser.add_argument("--rate", type=float, help="backend requests per second (XSLM_RATE_LIMIT)")
+    parser.add_argument("--files", type=int, help="files translated at once in a folder (XSLM_MAX_CONCURRENT_FILES)")
+    parser.add_argument("--workers", type=int, help="processes parsing and saving workbooks (XSLM_PROCESS_WORKERS)")
+    parser.add_argument("--engine", help="openpyxl, streaming, shared_strings or auto (XSLM_ENGINE)")
+    parser.add_argument("--backend", help="translation backend, e.g. googletrans or stub (XSLM_BACKEND)")
+    parser.add_argument("--backend-options", help="JSON options for the backend (XSLM_BACKEND_OPTIONS)")
+    parser.add_argument("--classifier-config", help="JSON rules and column overrides for the cell classifier (XSLM_CLASSIFIER_CONFIG)")
+    parser.add_argument("--skip-target-language", action="store_const", const="1",
+                        help="leave cells that already look like the destination language untranslated (XSLM_SKIP_TARGET_LANGUAGE=1)")
+    parser.add_argument("--resolve-auto", action="store_const", const="1",
+                        help="with --src auto, detect the source language of each sheet offline (XSLM_RESOLVE_AUTO=1)")
+    parser.add_argument("--glossary", help="JSON or CSV glossary of fixed translations and do-not-translate terms (XSLM_GLOSSARY)")
+    parser.add_argument("--memory", help="translation memory path (XSLM_TM_PATH)")
+    parser.add_argument("--no-memory", action="store_true", help="do not read or write the translation memory")
+    parser.add_argument("--no-resume", action="store_true", help="ignore and do not write folder job journals")
+    parser.add_argument("--incremental", action="store_true", help="only re-translate cells changed since the last run")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (XSLM_LOG_LEVEL, default WARNING here)")
+    parser.add_argument("--log-file", help="also write the log to this file, rotated by size (XSLM_LOG_MAX_MB)")
+    parser.add_argument("--log-format", choices=("text", "json"), help="log records as text or one JSON object per line (XSLM_LOG_FORMAT)")
+    parser.add_argument("--json", action="store_true", help="print the results as one JSON object")
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"no such file or folder: {path}")
+    languages = [lang.strip() for lang in args.dest.split(",") if lang.strip()]
+    if not languages:
+        parser.error("--dest needs at least one language")
+    # A list makes the handlers fan out, one output per language
+    args.dest = languages[0] if len(languages) == 1 else languages
+    return args
+
+
+ENV_FLAGS = {
+    "concurrency": "XSLM_MAX_CONCURRENCY",
+    "rate": "XSLM_RATE_LIMIT",
+    "files": "XSLM_MAX_CONCURRENT_FILES",
+    "workers": "XSLM_PROCESS_WORKERS",
+    "engine": "XSLM_ENGINE",
+    "backend": "XSLM_BACKEND",
+    "backend_options": "XSLM_BACKEND_OPTIONS",
+    "memory": "XSLM_TM_PATH",
+    "glossary": "XSLM_GLOSSARY",
+    "classifier_config": "XSLM_CLASSIFIER_CONFIG",
+    "skip_target_language": "XSLM_SKIP_TARGET_LANGUAGE",
+    "resolve_auto": "XSLM_RESOLVE_AUTO",
+    "log_level": "XSLM_LOG_LEVEL",
+    "log_format": "XSLM_LOG_FORMAT",
+}
+
+
+class PrintLog:
+    """Stands in for the handlers' log queue, echoing messages unless quiet."""
+
+    def __init__(self, quiet):
+        self.quiet = quiet
+
+    async def put(self, message):
+        if not self.quiet:
+            print(message, file=sys.stderr)
+
+
+class NullProgress:
+    def progress(self, value):
+        pass
+
+
+async def run(args):
+    # Imported here so --help and argument errors stay instant
+    from utils.row_ds import CancellationToken
+    from utils.dedup import TranslationDeduplicator
+    from utils.handler import translate_file, translate_folder
+
+    translation_memory = None
+    if not args.no_memory:
+        from utils.tm_cache import TranslationMemory, DEFAULT_TM_PATH
+        translation_memory = TranslationMemory(DEFAULT_TM_PATH)
+
+    log = PrintLog(quiet=args.json)
+    token = CancellationToken()
+    results = {}
+    partial = {}  # the outputs written with strings left untranslated, and how many
+    try:
+        for path in args.paths:
+            if os.path.isdir(path):
+                folder_results = await translate_folder(path, args.src, args.dest, token, log, NullProgress(),
+                                                        translation_memory=translation_memory, resume=not args.no_resume,
+                                                        output_dir=args.output_dir, incremental=args.incremental)
+                results.update(folder_results)
+                partial.update(folder_results.partial)
+            else:
+                deduplicator = TranslationDeduplicator(translation_memory=translation_memory)
+                try:
+                    results[path] = await translate_file(path, args.src, args.dest, token, log, NullProgress(),
+                                                         deduplicator=deduplicator, incremental=args.incremental,
+                                                         output_dir=args.output_dir)
+                except RuntimeError as e:
+                    print(e, file=sys.stderr)
+                    results[path] = None
+                untranslated = {}
+                for _, dest, _ in deduplicator.failed:
+                    untranslated[dest] = untranslated.get(dest, 0) + 1
+                if results[path] and untranslated:
+                    partial[path] = untranslated if isinstance(results[path], dict) else sum(untranslated.values())
+    finally:
+        if translation_memory is not None:
+            translation_memory.close()
+    return results, partial
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for flag, variable in ENV_FLAGS.items():
+        value = getattr(args, flag)
+        if value is not None:
+            os.environ[variable] = str(value)
+    # The library logs at DEBUG by default; a batch run only wants problems
+    os.environ.setdefault("XSLM_LOG_LEVEL", "WARNING")
+
+    if args.log_file:
+        from utils.logging_mech import enable_file_logging
+        enable_file_logging(args.log_file)
+
+    import asyncio
+    try:
+        results, partial = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("Interrupted.", file=sys.stderr)
+        return 130
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for input_file, output in results.items():
+            untranslated = partial.get(input_file)
+            for lang, output_file in (output.items() if isinstance(output, dict) else [(None, output)]):
+                left = untranslated.get(lang) if isinstance(untranslated, dict) else untranslated
+                note = f" (PARTIAL: {left} strings left untranslated)" if output_file and left else ""
+                print(f"{input_file}{f' [{lang}]' if lang else ''} -> {output_file or 'FAILED'}{note}")
+    outputs = [output_file for output in results.values() for output_file in (output.values() if isinstance(output, dict) else [output])]
+    if not outputs or not all(outputs):
+        return 1
+    if partial:
+        print(f"{len(partial)} files were written with strings left untranslated; run again to retry them", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
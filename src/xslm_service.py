@@ -0,0 +1,105 @@
+"""
+HTTP job service entry point. Run from the `src` directory:
+
+    python -m xslm_service --workers 4
+    python -m xslm_service --workers 8 --no-server --queue-dir /mnt/shared/xslm-jobs
+
+The first serves the API (see utils.service) on 127.0.0.1:8765 with four worker processes. The
+second adds eight more workers on another host that mounts the same queue directory. Flags
+override the matching XSLM_* environment variables; each worker process gets its own backend
+and RequestScheduler, so --rate and --concurrency apply per worker.
+"""
+import os
+import sys
+import signal
+import argparse
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m xslm_service", description="Serve translation jobs over HTTP.")
+    parser.add_argument("--host", help="address to listen on (XSLM_SERVICE_HOST, default 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="port to listen on (XSLM_SERVICE_PORT, default 8765)")
+    parser.add_argument("--workers", type=int, help="worker processes on this host (XSLM_SERVICE_WORKERS, default 2)")
+    parser.add_argument("--queue-dir", help="queue database and uploads, shared by all hosts (XSLM_QUEUE_DIR)")
+    parser.add_argument("--max-pending", type=int, help="queued jobs beyond which submissions get 503 (XSLM_QUEUE_MAX_PENDING)")
+    parser.add_argument("--no-server", action="store_true", help="only run workers, e.g. on an extra host")
+    parser.add_argument("--concurrency", type=int, help="backend requests in flight per worker (XSLM_MAX_CONCURRENCY)")
+    parser.add_argument("--rate", type=float, help="backend requests per second per worker (XSLM_RATE_LIMIT)")
+    parser.add_argument("--backend", help="translation backend, e.g. googletrans or stub (XSLM_BACKEND)")
+    parser.add_argument("--backend-options", help="JSON options for the backend (XSLM_BACKEND_OPTIONS)")
+    parser.add_argument("--glossary", help="JSON or CSV glossary of fixed translations and do-not-translate terms (XSLM_GLOSSARY)")
+    parser.add_argument("--memory", help="translation memory path (XSLM_TM_PATH)")
+    parser.add_argument("--no-memory", action="store_true", help="do not read or write the translation memory")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (XSLM_LOG_LEVEL, default INFO here)")
+    parser.add_argument("--log-file", help="also write the log to this file, rotated by size (XSLM_LOG_MAX_MB)")
+    parser.add_argument("--log-format", choices=("text", "json"), help="log records as text or one JSON object per line (XSLM_LOG_FORMAT)")
+    args = parser.parse_args(argv)
+    if args.no_server and args.workers == 0:
+        parser.error("--no-server needs at least one worker")
+    return args
+
+
+ENV_FLAGS = {
+    "host": "XSLM_SERVICE_HOST",
+    "port": "XSLM_SERVICE_PORT",
+    "workers": "XSLM_SERVICE_WORKERS",
+    "queue_dir": "XSLM_QUEUE_DIR",
+    "max_pending": "XSLM_QUEUE_MAX_PENDING",
+    "concurrency": "XSLM_MAX_CONCURRENCY",
+    "rate": "XSLM_RATE_LIMIT",
+    "backend": "XSLM_BACKEND",
+    "backend_options": "XSLM_BACKEND_OPTIONS",
+    "memory": "XSLM_TM_PATH",
+    "glossary": "XSLM_GLOSSARY",
+    "log_level": "XSLM_LOG_LEVEL",
+    "log_format": "XSLM_LOG_FORMAT",
+}
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Set before anything is imported, so the modules and the spawned workers read them
+    for flag, variable in ENV_FLAGS.items():
+        value = getattr(args, flag)
+        if value is not None:
+            os.environ[variable] = str(value)
+    os.environ.setdefault("XSLM_LOG_LEVEL", "INFO")
+
+    from utils.logging_mech import logger, enable_file_logging
+    from utils.job_queue import JobQueue, QUEUE_DIR
+    from utils.service import make_server, start_workers, stop_workers, SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS
+
+    if args.log_file:
+        enable_file_logging(args.log_file)
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    queue = JobQueue(QUEUE_DIR)
+    processes, stop_event = start_workers(QUEUE_DIR, SERVICE_WORKERS, use_memory=not args.no_memory)
+    server = None
+    try:
+        if args.no_server:
+            for process in processes:
+                process.join()
+        else:
+            server = make_server(queue, SERVICE_HOST, SERVICE_PORT)
+            logger.info(f"Serving jobs at http://{SERVICE_HOST}:{SERVICE_PORT}/jobs with {len(processes)} workers on {QUEUE_DIR}")
+            server.serve_forever()
+    except KeyboardInterrupt:
+        # A second signal must not cut the workers' hand-back short; stop_workers bounds the wait
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        logger.info("Stopping; running jobs go back to the queue")
+    finally:
+        if server is not None:
+            server.server_close()
+        stop_workers(processes, stop_event)
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())